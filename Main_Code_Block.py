@@ -10,20 +10,55 @@ This program solves the Lazor Game by:
 
 """
 
+import argparse
+import bisect
+import collections
+import contextlib
+import cProfile
+import functools
+import glob
+import heapq
+import hashlib
+import io
+import itertools
+import json
+import logging
+import math
+import mmap
+import sys
 import time 
-import copy
+import types
 import os
+import struct
+import copy
+import multiprocessing
+import sqlite3
 from dataclasses import dataclass
-from typing import List, Set, Optional
+from typing import IO, Callable, Iterable, Iterator, List, Mapping, NamedTuple, Sequence, Set, Optional, Union
 
-@dataclass
-class Point:
+logger = logging.getLogger(__name__)
+
+try:
+    from pysat.card import CardEnc, EncType
+    from pysat.formula import IDPool
+    from pysat.solvers import Solver as SatSolver
+except ImportError:  # python-sat is optional, only the 'sat' strategy needs it
+    SatSolver = None
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, only the 'batch' strategy needs it
+    np = None
+
+class Point(NamedTuple):
     '''
     2D point class to represent a point with integer coordinates. 
-    It does the following using dataclass:
+    It is an immutable named tuple (no __dict__), so:
+        Comparing 2 points - done by the tuple comparison in C.
+        Hashing - done by the tuple hash in C, so it is cheap to use in sets/dictionaries.
+        A point can't be changed after it is used as a key.
+    It also does the following:
         Adding 2 points.
-        Comparing 2 points.
-        Hashing - so that it can be used in sets/dictionaries.
         String documentation - for debugging. 
     '''
     x: int
@@ -31,28 +66,25 @@ class Point:
 
     def __add__(self, other: 'Point') -> 'Point':
         """ Add two points component-wise."""
-        return Point(self.x + other.x, self.y + other.y)
-    
-    def __eq__ (self, other: object) -> bool:
-        """Checks to see if the two points have the same coordinates."""
-        if not isinstance(other, Point):
-            return NotImplemented
-        return self.x == other.x and self.y == other.y 
-    
-    def __hash__(self) -> int:
-        """ Make Point hashable for use in sets/dictionaries."""
-        return hash((self.x, self.y))
+        # tuple.__new__ skips the slower generated NamedTuple constructor
+        return _new_tuple(Point, (self[0] + other[0], self[1] + other[1]))
     
     def __repr__(self) -> str:
         """ String for debugging."""
         return f"Point({self.x}, {self.y})"
 
-@dataclass
-class Laser:
+
+# Builds a Point from an (x, y) tuple without the generated NamedTuple
+# constructor, for the hot loops that make a point per step
+_new_tuple = tuple.__new__
+
+
+class Laser(NamedTuple):
     """
     Represents a laser beam with: 
         orgin: starting point
         direction: normalized direction vector (components are +/- 1)
+    It is an immutable named tuple, like Point.
     """
     origin: Point
     direction: Point 
@@ -172,6 +204,40 @@ class RefractBlock (Block):
         
         return [transmitted, reflected]
 
+# Block classes for each block letter used in .bff files
+BLOCK_TYPES = {'A': ReflectBlock, 'B': OpaqueBlock, 'C': RefractBlock}
+
+
+@functools.lru_cache(maxsize=None)
+def zobrist_key(x: int, y: int, block_name: str) -> int:
+    """
+    Get the random 64-bit number of a block type at a position, used for
+    the Zobrist hash of a grid (the XOR of the numbers of all its blocks).
+    The numbers come from a hash of the position and block type instead of
+    a random generator, so they are the same in every process and run.
+
+    Arguments:
+        x, y: position of the block
+        block_name: class name of the block
+
+    Returns:
+        64-bit integer
+    """
+    digest = hashlib.blake2b(f"{x},{y},{block_name}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+# Binary board format of Board.to_bytes: magic, width, height, counts of
+# the A, B and C blocks, then the number of blocks, lasers, targets and
+# empty positions, all little-endian
+BOARD_MAGIC = b'LZB1'
+BOARD_HEADER = struct.Struct('<4s2H3H4H')
+BOARD_BLOCK = struct.Struct('<2hB')  # x, y, block code
+BOARD_LASER = struct.Struct('<4h')  # x, y, dx, dy
+BOARD_POINT = struct.Struct('<2h')  # x, y
+BLOCK_FIXED = 0x80  # flag of fixed blocks in the block code of BOARD_BLOCK
+
+
 class Board:
     """
     Represents the game board with:
@@ -191,16 +257,42 @@ class Board:
         self.width = width
         self.height = height
         # self.grid = {}  # dictionary mapping positions to Block objects
-        self.grid: dict[Point, Block] = {}
+        self._grid: dict[Point, Block] = {}  # blocks by position, see grid
         # self.lasers = []  # list of Laser objects (starting points)
         self.lasers: List[Laser] = []
         self.targets: Set[Point] = set()  # set of Point objects that must be intersected
         self.available_blocks = {'A': 0, 'B': 0, 'C': 0}  # available block counts
         self.empty_positions: List[Point] = []
+        # Traced laser segments, keyed by the (x, y, dx, dy) tuple of the
+        # laser that starts them: (points passed through, lasers leaving the block hit)
+        self._segments: dict[tuple[int, int, int, int], tuple[List[Point], List[tuple[int, int, int, int]]]] = {}
+        # For each point, the keys of the traced segments passing through it
+        self._point_segments: dict[Point, Set[tuple[int, int, int, int]]] = {}
+        self._grid_hash = 0  # Zobrist hash of the grid, see grid_hash
+
+    @property
+    def grid(self) -> Mapping[Point, Block]:
+        """
+        Read-only view of the blocks on the board, keyed by position.
+        Blocks are changed through add_block and remove_block, which keep
+        the traced laser segments and grid_hash up to date.
+        """
+        return types.MappingProxyType(self._grid)
+
+    @property
+    def grid_hash(self) -> int:
+        """
+        64-bit Zobrist hash of the blocks on the grid, kept up to date by
+        add_block and remove_block. Boards with the same blocks at the
+        same positions have the same hash, whatever order they were added in.
+        """
+        return self._grid_hash
 
     def add_block(self, block: Block) -> None:
         """
         Add a block to the board.
+        Blocks should always be added and removed through add_block and
+        remove_block so the traced laser segments and grid_hash stay up to date.
         
         Arguments
             block: block to add
@@ -208,9 +300,43 @@ class Board:
         Raises:
             ValueError: raises error if position is already occupied
         """
-        if block.pos in self.grid:
+        if block.pos in self._grid:
             raise ValueError(f"Position {block.pos} already occupied")
-        self.grid[block.pos] = block
+        self._grid[block.pos] = block
+        self._grid_hash ^= zobrist_key(block.pos.x, block.pos.y, type(block).__name__)
+        self._invalidate_segments(block.pos)
+
+    def remove_block(self, pos: Point) -> Block:
+        """
+        Remove the block at a position from the board.
+
+        Arguments
+            pos: position of the block to remove
+
+        Returns:
+            the removed block
+
+        Raises:
+            KeyError: raises error if there is no block at the position
+        """
+        block = self._grid.pop(pos)
+        self._grid_hash ^= zobrist_key(pos.x, pos.y, type(block).__name__)
+        self._invalidate_segments(pos)
+        return block
+
+    def _invalidate_segments(self, pos: Point) -> None:
+        """
+        Forget every traced laser segment that passes through a position,
+        so it is traced again the next time the lasers are simulated.
+
+        Arguments
+            pos: position whose contents changed
+        """
+        for key in self._point_segments.pop(pos, ()):
+            points, _ = self._segments.pop(key)
+            for point in points:
+                if point != pos:
+                    self._point_segments[point].discard(key)
 
     def add_laser(self, x: int, y: int, dx: int, dy: int) -> None:
         """
@@ -254,300 +380,2499 @@ class Board:
     def simulate_lasers(self) -> Set[Point]:
         """
         Simulate all laser paths through the current board configuration.
+        Segments traced by earlier calls are reused, so only the lasers
+        whose path crossed a changed position are traced again. Lasers are
+        handled as (x, y, dx, dy) tuples while tracing.
         
         Returns:
             set of all points that lasers pass through
         """
         visited = set()  # points visited by lasers
         visited_laser_origins = set()  # keep track of laser origins to avoid infinite loops
-        active_lasers = [copy.deepcopy(laser) for laser in self.lasers]  # working copy
+        active_lasers = [(laser.origin.x, laser.origin.y, laser.direction.x, laser.direction.y)
+                         for laser in self.lasers]
 
         while active_lasers:
-            laser = active_lasers.pop()
-            current = laser.origin
-            direction = laser.direction
-
             # Add a unique identifier for this laser to prevent loops
-            laser_id = (current, direction)
+            laser_id = active_lasers.pop()
             if laser_id in visited_laser_origins:
                 continue
             visited_laser_origins.add(laser_id)
 
-            while True:
-                # Move laser one step in its direction
-                previous = current
-                current = current + direction
+            segment = self._segments.get(laser_id)
+            if segment is None:
+                segment = self._trace_segment(*laser_id)
+            points, new_lasers = segment
 
-                # Check if laser went out of bounds
-                if not self.is_valid_position(current):
-                    break
+            # Record the points visited by this laser
+            visited.update(points)
+            active_lasers.extend(new_lasers)
 
-                # Record this point as visited by a laser
-                visited.add(current)
+        return visited
 
-                # Check for block interaction
-                if current in self.grid:
-                    block = self.grid[current]
-                    new_lasers = block.interact(Laser(previous, direction))
-                    active_lasers.extend(new_lasers)
-                    break
+    def _trace_segment(self, x: int, y: int, dx: int, dy: int) -> tuple[List[Point], List[tuple[int, int, int, int]]]:
+        """
+        Trace a laser in a straight line until it leaves the board or hits
+        a block, and store the segment for later simulations.
 
-        return visited
+        Arguments:
+            x, y: starting point of the laser
+            dx, dy: direction of the laser
+
+        Returns:
+            points the laser passes through, and the (x, y, dx, dy) of each
+            laser leaving the block it hits
+        """
+        key = (x, y, dx, dy)
+        points = []
+        new_lasers = []
+        grid = self._grid
+
+        while True:
+            # Move laser one step in its direction
+            x += dx
+            y += dy
+
+            # Check if laser went out of bounds
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                break
+
+            current = _new_tuple(Point, (x, y))
+            points.append(current)
+
+            # Check for block interaction
+            block = grid.get(current)
+            if block is not None:
+                laser = Laser(Point(x - dx, y - dy), Point(dx, dy))
+                new_lasers = [(new_laser.origin.x, new_laser.origin.y,
+                               new_laser.direction.x, new_laser.direction.y)
+                              for new_laser in block.interact(laser)]
+                break
+
+        self._segments[key] = (points, new_lasers)
+        for point in points:
+            self._point_segments.setdefault(point, set()).add(key)
+        return points, new_lasers
     
     def is_solved(self) -> bool:
         """
         Check if the current board configuration solves the puzzle.
+        The lasers are followed like in simulate_lasers while counting the
+        targets not hit yet, and the check stops as soon as the last one
+        is hit, or fails once every laser has ended.
         
         Returns:
             true if all targets are hit by lasers, otherwise false 
         """
-        laser_paths = self.simulate_lasers()
-        return self.targets.issubset(laser_paths)
-    
+        remaining = set(self.targets)  # targets not hit yet
+        visited_laser_origins = set()  # keep track of laser origins to avoid infinite loops
+        active_lasers = [(laser.origin.x, laser.origin.y, laser.direction.x, laser.direction.y)
+                         for laser in self.lasers]
 
+        while remaining and active_lasers:
+            laser_id = active_lasers.pop()
+            if laser_id in visited_laser_origins:
+                continue
+            visited_laser_origins.add(laser_id)
 
-# def parse_bff(filename):
-def parse_bff(filename: str) -> tuple[List[List[str]], Board]:
-    '''
-    Parse a .bff file to create a Board object.
+            segment = self._segments.get(laser_id)
+            if segment is None:
+                segment = self._trace_segment(*laser_id)
+            points, new_lasers = segment
 
-    Arguments:
-        filename: path to the .bff file
+            remaining.difference_update(points)
+            active_lasers.extend(new_lasers)
 
-    Returns:
-        Board object initialised with the parsed data.
-    '''
-    with open(filename, 'r') as f:
-        lines = [line.strip() for line in f.readlines()]
+        return not remaining
 
-    lines = [line for line in lines if line and not line.startswith('#')]  # remove comments and empty lines
+    def block_letter(self, pos: Point) -> Optional[str]:
+        """
+        Get the .bff letter of the block at a position.
 
-    grid = []
-    available_blocks = {'A': 0, 'B': 0, 'C': 0}
-    lasers = []
-    targets = []
-    read_grid = False
+        Arguments:
+            pos: position to check
 
-    # Iterate through lines to parse the grid and other elements
-    for line in lines:
-        if line == 'GRID START':
-            read_grid = True
-            continue
-        elif line == 'GRID STOP':
-            read_grid = False
-            continue
+        Returns:
+            'A', 'B' or 'C', or None if there is no block at the position
+        """
+        block = self._grid.get(pos)
+        for letter, block_class in BLOCK_TYPES.items():
+            if type(block) is block_class:
+                return letter
+        return None
 
-        if read_grid:
-            grid.append(line.split())  # process grid lines
-        else:
-            parts = line.split()  # process other lines
-            if not parts:
-                continue
+    def grid_letters(self) -> List[List[str]]:
+        """
+        Get the .bff grid of the board: 'o' at empty positions, the letter
+        of each fixed block, and 'x' elsewhere.
 
-            instruction = parts[0]
-            if instruction in ('A', 'B', 'C'):
-                available_blocks[instruction] = int(parts[1])
+        Returns:
+            rows of .bff letters, as returned by parse_bff
+        """
+        grid = [['x'] * (self.width // 2) for _ in range(self.height // 2)]
+        for pos in self.empty_positions:
+            grid[pos.y // 2][pos.x // 2] = 'o'
+        for pos, block in self._grid.items():
+            if block.fixed:
+                grid[pos.y // 2][pos.x // 2] = self.block_letter(pos)
+        return grid
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the board to the compact binary format read by
+        from_bytes: a BOARD_HEADER with the size, block counts and the
+        number of each kind of record, followed by the records
+            blocks: x, y, block code (+ BLOCK_FIXED if fixed)
+            lasers: x, y, dx, dy
+            targets: x, y
+            empty positions: x, y
+        
+        Returns:
+            bytes of the board
+        """
+        blocks = sorted(self._grid.items())
+        targets = sorted(self.targets)
+        parts = [BOARD_HEADER.pack(BOARD_MAGIC, self.width, self.height,
+                                   *(self.available_blocks[letter] for letter in BLOCK_CODES),
+                                   len(blocks), len(self.lasers), len(targets), len(self.empty_positions))]
+        parts.extend(BOARD_BLOCK.pack(pos.x, pos.y, BLOCK_CODES[self.block_letter(pos)] | (BLOCK_FIXED if block.fixed else 0))
+                     for pos, block in blocks)
+        parts.extend(BOARD_LASER.pack(*laser.origin, *laser.direction) for laser in self.lasers)
+        parts.extend(BOARD_POINT.pack(*pos) for pos in targets)
+        parts.extend(BOARD_POINT.pack(*pos) for pos in self.empty_positions)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> 'Board':
+        """
+        Build a board from the bytes written by to_bytes.
 
-            elif instruction == 'L':  # Laser in format L x y dx dy
-                x, y, norm_dx, norm_dy = map(int, parts[1:5])
-                lasers.append((x, y, norm_dx, norm_dy))
+        Arguments:
+            data: bytes of the board
 
-            elif instruction == 'P':  # Target in format P x y
-                x, y = map(int, parts[1:3])
-                targets.append((x, y))
-    
+        Returns:
+            Board with the blocks, lasers, targets, empty positions and
+            block counts of the serialized board
 
-    print(f"Grid demensions: {len(grid)}x{len(grid[0])}")
-    print(f"Available blocks: {available_blocks}")
-    print(f"Laser count: {len(lasers)}")
-    print(f"Target count: {len(targets)}")
+        Raises:
+            ValueError: raises error if data is not a serialized board
+        """
+        view = memoryview(data)
+        try:
+            magic, width, height, *counts = BOARD_HEADER.unpack_from(view)
+        except struct.error as error:
+            raise ValueError(f"Not a serialized board: {error}") from None
+        if magic != BOARD_MAGIC:
+            raise ValueError("Not a serialized board")
+        block_counts, (n_blocks, n_lasers, n_targets, n_empty) = counts[:len(BLOCK_CODES)], counts[len(BLOCK_CODES):]
+
+        # Slice the records out of the view, one section after the other
+        offset = BOARD_HEADER.size
+        def records(record, count):
+            nonlocal offset
+            end = offset + record.size * count
+            if end > len(view):
+                raise ValueError("Serialized board is truncated")
+            section = record.iter_unpack(view[offset:end])
+            offset = end
+            return section
+
+        board = cls(width, height)
+        board.available_blocks = dict(zip(BLOCK_CODES, block_counts))
+        for x, y, code in records(BOARD_BLOCK, n_blocks):
+            letter = BLOCK_LETTERS.get(code & ~BLOCK_FIXED)
+            if letter is None:
+                raise ValueError(f"Unknown block code {code} in serialized board")
+            board.add_block(BLOCK_TYPES[letter](Point(x, y), fixed=bool(code & BLOCK_FIXED)))
+        board.lasers = [Laser(Point(x, y), Point(dx, dy)) for x, y, dx, dy in records(BOARD_LASER, n_lasers)]
+        board.targets = {Point(x, y) for x, y in records(BOARD_POINT, n_targets)}
+        board.empty_positions = [Point(x, y) for x, y in records(BOARD_POINT, n_empty)]
+        return board
+
+
+# Block codes stored in CompactBoard.cells (0 means no block)
+BLOCK_CODES = {'A': 1, 'B': 2, 'C': 3}
+BLOCK_LETTERS = {code: letter for letter, code in BLOCK_CODES.items()}
+# Block class name of each block code, for zobrist_key
+BLOCK_NAMES = {code: BLOCK_TYPES[letter].__name__ for letter, code in BLOCK_CODES.items()}
+
+# Laser directions used by CompactBoard, the direction code is the index
+DIRECTIONS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+
+def build_transitions() -> List[Optional[tuple[int, ...]]]:
+    """
+    Precompute how each block type changes each laser direction.
+    A laser moving one step in a direction always enters a block from the
+    side opposite to it, so the entry side follows from the direction. The
+    table is filled by calling the interact() method of each Block class
+    once per direction, so it always matches them.
 
-    # Evaulate the board dimensions
-    height = len(grid)
-    # width = len(grid[0])
-    width = len(grid[0]) if height > 0 else 0
-    
-    # Create the board
-    board = Board(width * 2, height *2)  # Muliply by 2 to account for the fine grid
+    Returns:
+        list indexed by block_code * len(DIRECTIONS) + direction_code, with
+        the direction codes of the outgoing lasers, or None if the laser
+        cannot enter the block from that direction
+    """
+    transitions = [None] * (len(DIRECTIONS) * (max(BLOCK_CODES.values()) + 1))
+    pos = Point(0, 0)
+    for letter, code in BLOCK_CODES.items():
+        block = BLOCK_TYPES[letter](pos)
+        for direction_code, (dx, dy) in enumerate(DIRECTIONS):
+            try:
+                new_lasers = block.interact(Laser(Point(-dx, -dy), Point(dx, dy)))
+            except ValueError:
+                continue
+            transitions[code * len(DIRECTIONS) + direction_code] = tuple(
+                DIRECTION_CODES[(laser.direction.x, laser.direction.y)] for laser in new_lasers)
+    return transitions
 
-    # Add fixed blocks to the board
-    for y, row in enumerate(grid):
-        for x, cell in enumerate(row):
-            pos = Point(x * 2, y * 2)
-            if cell == 'o':  # Empty position where blocks can be placed
-                board.empty_positions.append(pos)
-            elif cell == 'A':
-                board.add_block(ReflectBlock(pos, fixed=True))
-            elif cell == 'B':
-                board.add_block(OpaqueBlock(pos, fixed=True))
-            elif cell == 'C':
-                board.add_block(RefractBlock(pos, fixed=True))
 
-    
-    # Add available blocks to the board
-    board.available_blocks = available_blocks
+TRANSITIONS = build_transitions()
 
-    # Add lasers to the board
-    for x, y, norm_dx, norm_dy in lasers:
-        board.add_laser(x, y, norm_dx, norm_dy)
 
-    # Add targets to the board
-    for x, y in targets:
-        board.add_target(x, y)
-    
-    print(f"Empty positions: {board.empty_positions}")
-    print(f"Fixed blocks: {len(board.grid)}")
+def build_incoming() -> List[tuple[int, ...]]:
+    """
+    Invert TRANSITIONS: for each block type and outgoing direction, find
+    the directions a laser can hit the block in to leave it that way.
 
-    return grid, board
+    Returns:
+        list indexed by block_code * len(DIRECTIONS) + outgoing direction
+        code, with the incoming direction codes
+    """
+    incoming = [[] for _ in TRANSITIONS]
+    for key, outgoing in enumerate(TRANSITIONS):
+        code, direction = divmod(key, len(DIRECTIONS))
+        for new_direction in outgoing or ():
+            incoming[code * len(DIRECTIONS) + new_direction].append(direction)
+    return [tuple(directions) for directions in incoming]
 
 
-# def solver(board):
-def solver(board: Board) -> Optional[List[Block]]:
+INCOMING = build_incoming()
+
+
+class CompactBoard:
     """
-    Solve the Lazor game by finding a valid block placement.
-    
-    Arguments:
-        board: Board object to solve
-        
-    Returns:
-        List of blocks that make the board solvable, or None if no solution is found.
+    Compact board representation used by the solver.
+    Points of the fine grid are single integers y * width + x, and the
+    blocks are stored as block codes in a flat bytearray indexed by them,
+    so no Point or Block objects are created or hashed while simulating.
+    Lasers are (x, y, direction code) tuples and block interactions are
+    looked up in TRANSITIONS.
     """
-    
-    # Get all positions marked with 'o' (empty blocks)
-    # empty_blocks = board.empty_positions.copy()
-    #for pos in board.grid:
-    #    if board.grid[pos] is None:
-    #        empty_blocks.append(pos)
+    def __init__(self, width: int, height: int) -> None:
+        """
+        Initialize an empty compact board.
 
-    # Get the available blocks to place on the board
-    # Converte 'A', 2 into 'A', 'A' etc.
-    blocks_placable = []
-    for block_type, count in board.available_blocks.items():
-        blocks_placable.extend([block_type] * count)
+        Arguments
+            width: maximum x-coordinate
+            height: maximum y-coordinate
+        """
+        self.width = width
+        self.height = height
+        self.cells = bytearray(width * height)  # block code at each point
+        self.lasers: List[tuple[int, int, int]] = []
+        # Indices of the target points and their bitmask, see targets
+        self._targets: frozenset[int] = frozenset()
+        self._target_mask = 0
+        self.available_blocks = {'A': 0, 'B': 0, 'C': 0}
+        self.empty_positions: List[int] = []
+        # Traced laser segments, keyed by the laser that starts them:
+        # (indices passed through, lasers leaving the block hit, bitmask
+        # of the indices passed through)
+        self._segments: dict[tuple[int, int, int], tuple[List[int], List[tuple[int, int, int]], int]] = {}
+        # For each index, the keys of the traced segments passing through it.
+        # Keys are not removed when their segment is forgotten, so a key
+        # may be listed at an index its current segment no longer reaches
+        self._point_segments: dict[int, Set[tuple[int, int, int]]] = {}
+        # Complete paths of the laser sources, keyed by the source: bitmask
+        # of every index the source's lasers pass through. A path only
+        # depends on the blocks at these indices
+        self._source_paths: dict[tuple[int, int, int], int] = {}
+        # For each index, the laser sources whose path passes through it,
+        # kept like _point_segments
+        self._point_sources: dict[int, Set[tuple[int, int, int]]] = {}
+        # Bitmasks of the first steps of a laser to the edge of the board,
+        # keyed by the laser, see _trace_ray. They do not depend on blocks
+        self._rays: dict[tuple[int, int, int], List[int]] = {}
+        # Work counters for SearchStats
+        self.simulations = 0  # calls to simulate the lasers
+        self.steps_traced = 0  # laser steps traced (not reused from earlier simulations)
+        self._grid_hash = 0  # Zobrist hash of the grid, see grid_hash
+
+    @classmethod
+    def from_board(cls, board: Board) -> 'CompactBoard':
+        """
+        Build the compact version of a board.
 
-    solution = []  # List to store the solution blocks
+        Arguments
+            board: board to convert
 
-    # Backtracking function to check all combinations of blocks
-    def try_place(index):
+        Returns:
+            CompactBoard with the same blocks, lasers, targets and empty positions
         """
-        Recursive function for block placements.
+        compact = cls(board.width, board.height)
+        for pos in board.grid:
+            compact.add_block(compact.index(pos), BLOCK_CODES[board.block_letter(pos)])
+        compact.lasers = [(laser.origin.x, laser.origin.y,
+                           DIRECTION_CODES[(laser.direction.x, laser.direction.y)])
+                          for laser in board.lasers]
+        compact.targets = {compact.index(target) if board.is_valid_position(target) else -1
+                           for target in board.targets}
+        compact.available_blocks = dict(board.available_blocks)
+        compact.empty_positions = [compact.index(pos) for pos in board.empty_positions]
+        return compact
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle the board without its traced segments and paths, so only
+        the compact board itself is sent to worker processes.
+        """
+        state = self.__dict__.copy()
+        state['_segments'] = {}
+        state['_point_segments'] = {}
+        state['_source_paths'] = {}
+        state['_point_sources'] = {}
+        state['_rays'] = {}
+        return state
+
+    def index(self, pos: Point) -> int:
+        """
+        Get the index of a point on the board.
 
-        Arguments:
-            index: current index in the blocks list
+        Arguments
+            pos: point inside the board
 
         Returns:
-            True if a soludtion is found, otherwise False.
+            index of the point in cells
         """
-        if index >= len(blocks_placable):
-            # Check if the board is solved with the current configuration
-            return board.is_solved()
-        
-        # Try each empty position for the current block
-        for pos in board.empty_positions:
-            # Skip if the position is already occupied
-            if pos in board.grid:
-                continue
+        return pos.y * self.width + pos.x
 
-            current_type = blocks_placable[index]  # Get the current block type
-            if current_type == 'A':
-                block = ReflectBlock(pos)  # Create a ReflectBlock
-            elif current_type == 'B':
-                block = OpaqueBlock(pos)  # Create an OpaqueBlock
-            elif current_type == 'C':
-                block = RefractBlock(pos)  # Create a RefractBlock
-            
+    def point(self, index: int) -> Point:
+        """
+        Get the point at an index of the board.
 
-            # Add the block to the board
-            board.add_block(block)
-            solution.append(block)
+        Arguments
+            index: index in cells
 
+        Returns:
+            point at the index
+        """
+        return Point(index % self.width, index // self.width)
 
-            # Check if the board is valid with the current block placement
-            if try_place(index + 1):
-                return True
+    @property
+    def grid_hash(self) -> int:
+        """
+        64-bit Zobrist hash of the blocks on the grid, the same as the
+        grid_hash of a Board with the same blocks.
+        """
+        return self._grid_hash
 
-            # Remove the block if no solution
-            del board.grid[pos]
-            solution.pop()
+    def add_block(self, index: int, code: int) -> None:
+        """
+        Add a block to the board.
 
-        return False
+        Arguments
+            index: index of the block position
+            code: block code of the block
 
-    if try_place(0):
-        return solution  # Return the solution blocks if found
-    return None
+        Raises:
+            ValueError: raises error if position is already occupied
+        """
+        if self.cells[index]:
+            raise ValueError(f"Position {self.point(index)} already occupied")
+        self.cells[index] = code
+        self._grid_hash ^= zobrist_key(index % self.width, index // self.width, BLOCK_NAMES[code])
+        self._invalidate_segments(index)
 
+    def remove_block(self, index: int) -> None:
+        """
+        Remove the block at an index from the board.
 
-def save_solution(board: Board, grid: List[List[str]], filename: str) -> None:
-    """
-    Save the solution into a file with the original grid format.
-    'o' is replaced with the block type used in the solution.
+        Arguments
+            index: index of the block position
+        """
+        code = self.cells[index]
+        if code:
+            self._grid_hash ^= zobrist_key(index % self.width, index // self.width, BLOCK_NAMES[code])
+        self.cells[index] = 0
+        self._invalidate_segments(index)
 
-    Arguments:
-        board: Board object with the solution
-        grid: original grid layout in bff file
-        filename: path to save the solution file as {original}_solution.bff
-    """
-    with open(filename, 'w') as f:
-        f.write("GRID START\n")
+    def _invalidate_segments(self, index: int) -> None:
+        """
+        Forget every traced laser segment and source path that passes
+        through an index. Their keys are left at the other indices they
+        pass through; a key found there later, whose segment may have
+        been traced again on another path, is forgotten too, which only
+        costs tracing it again.
 
-        # Start going through each row of the grid
-        for y, row in enumerate(grid):
-            solution_row = []  # To store the row of the solution
+        Arguments
+            index: index whose contents changed
+        """
+        for key in self._point_segments.pop(index, ()):
+            self._segments.pop(key, None)
+        for source in self._point_sources.pop(index, ()):
+            self._source_paths.pop(source, None)
 
-            # Go through each cell in the row
-            for x, cell in enumerate(row):
-                pos = Point(x * 2, y * 2)  # Get the position in the fine grid
+    def block_letter(self, pos: Point) -> Optional[str]:
+        """
+        Get the .bff letter of the block at a position.
 
+        Arguments:
+            pos: position to check
 
-                if cell == 'x':
-                    solution_row.append('x')
-                elif cell == 'o':
-                    if pos in board.grid:
-                        block = board.grid[pos]  # Get the block at the position
-                        
-                        # Start placing the block type in the solution row
-                        if isinstance(block, ReflectBlock):
-                            solution_row.append('A')
-                        elif isinstance(block, OpaqueBlock):
-                            solution_row.append('B')
-                        elif isinstance(block, RefractBlock):
-                            solution_row.append('C')
-                        
-                    else:
-                        solution_row.append('o')  # If no functional block is placed, keep it as 'o'
-                else:
-                    solution_row.append(cell)  #  Keep the original block type if no change occured
-            
-            #Write the solution row to the file with space between each cell
-            f.write(' '.join(solution_row) + '\n')
+        Returns:
+            'A', 'B' or 'C', or None if there is no block at the position
+        """
+        code = self.cells[self.index(pos)]
+        for letter, block_code in BLOCK_CODES.items():
+            if code == block_code:
+                return letter
+        return None
+
+    @property
+    def targets(self) -> frozenset[int]:
+        """
+        Indices of the target points. A target off the board can never be
+        hit and is stored as -1. The set is frozen so that target_mask
+        stays in step with it; assign a new set to change the targets.
+        """
+        return self._targets
+
+    @targets.setter
+    def targets(self, targets: Iterable[int]) -> None:
+        self._targets = frozenset(targets)
+        mask = 0
+        for target in self._targets:
+            mask |= 1 << (target if target >= 0 else self.width * self.height)
+        self._target_mask = mask
+
+    @property
+    def target_mask(self) -> int:
+        """
+        Bitmask of the targets, with bit i set for a target at index i.
+        A target off the board sets bit width * height, which no laser
+        can set. Computed once when the targets are set.
+        """
+        return self._target_mask
 
-        # Finish the file with GRID STOP
-        f.write("GRID STOP\n")
+    def simulate_lasers(self) -> Set[int]:
+        """
+        Simulate all laser paths through the current board configuration.
 
+        Returns:
+            set of the indices of all points that lasers pass through
+        """
+        visited, _ = self.simulate_partial_lasers(set())
+        return {index for index, bit in enumerate(reversed(bin(visited))) if bit == '1'}
 
-if __name__ == '__main__':
-    input_file = 'mad_4.bff'
-    output_file = 'mad_4_solution.txt'
+    def simulate_partial_lasers(self, undecided: Set[int],
+                                undecided_mask: Optional[int] = None) -> tuple[int, Set[int]]:
+        """
+        Simulate the lasers while blocks may still be placed at some empty
+        positions. A laser stops at the first undecided position it reaches,
+        since its path after that depends on the block placed there.
+        The complete path of a laser source that reaches no undecided
+        position is kept until a block changes on it, and reused whole.
+        Points are tracked as bitmasks, bit i for index i, so adding a
+        segment to the visited points is a single OR.
 
-    time_start = time.time()  # Start timer
+        Arguments:
+            undecided: indices of empty positions that may still get a block
+            undecided_mask: bitmask of the same indices, if the caller
+                keeps one up to date
 
-    grid, board = parse_bff(input_file)
-    solution = solver(board)
-    
-    # Debug information
-    print(f"Board dimensions: {board.width}x{board.height}")
-    print(f"Number of empty positions: {len(board.empty_positions)}")
-    print(f"Available blocks: {board.available_blocks}")
-    print(f"Number of lasers: {len(board.lasers)}")
-    print(f"Number of targets: {len(board.targets)}")
-
-    time_final = time.time()  # End timer
-    time_taken = time_final - time_start
-
-    if solution:
-        save_solution(board, grid, output_file)
-        print(f"Solution is saved to {output_file}.")
-    else:
-        print("No solution.")
+        Returns:
+            bitmask of the indices that lasers are certain to pass through,
+            and the set of undecided indices where lasers stopped
+        """
+        self.simulations += 1
+        if undecided_mask is None:
+            undecided_mask = 0
+            for index in undecided:
+                undecided_mask |= 1 << index
+        visited = 0  # bitmask of the points visited by lasers
+        reached_undecided = set()
+
+        for source in self.lasers:
+            path = self._source_paths.get(source)
+            if path is not None and not path & undecided_mask:
+                visited |= path
+            else:
+                visited |= self._trace_source(source, undecided_mask, reached_undecided)
+
+        return visited, reached_undecided
+
+    def _trace_source(self, source: tuple[int, int, int], undecided_mask: int = 0,
+                      reached_undecided: Optional[Set[int]] = None) -> int:
+        """
+        Follow the lasers of one laser source, stopping at undecided
+        positions, and keep the path of the source if no undecided
+        position was reached.
+
+        Arguments:
+            source: laser source as (x, y, direction code)
+            undecided_mask: bitmask of the undecided positions
+            reached_undecided: set receiving the undecided indices reached
+
+        Returns:
+            bitmask of the indices passed through
+        """
+        mask = 0  # bitmask of the points visited by the lasers of this source
+        segments = []  # indices of the complete segments followed
+        complete = True  # no undecided position was reached
+        visited_laser_origins = set()  # keep track of laser origins to avoid infinite loops
+        active_lasers = [source]
+        while active_lasers:
+            laser_id = active_lasers.pop()
+            if laser_id in visited_laser_origins:
+                continue
+            visited_laser_origins.add(laser_id)
+
+            segment = self._segments.get(laser_id)
+            if segment is None:
+                segment = self._trace_segment(*laser_id)
+            segment_points, new_lasers, segment_mask = segment
+
+            if not segment_mask & undecided_mask:
+                mask |= segment_mask
+                segments.append(segment_points)
+                active_lasers.extend(new_lasers)
+                continue
+
+            # Only keep the points up to the first undecided position
+            complete = False
+            for point in segment_points:
+                mask |= 1 << point
+                if undecided_mask >> point & 1:
+                    reached_undecided.add(point)
+                    break
+
+        if complete:
+            self._source_paths[source] = mask
+            for point in set().union(*segments):
+                self._point_sources.setdefault(point, set()).add(source)
+        return mask
+
+    def _trace_segment(self, x: int, y: int, direction: int) -> tuple[List[int], List[tuple[int, int, int]], int]:
+        """
+        Trace a laser in a straight line until it leaves the board or hits
+        a block, and store the segment for later simulations.
+
+        Arguments:
+            x, y: starting point of the laser
+            direction: direction code of the laser
 
-    print(f"{time_taken:.3f} seconds to solve.")
\ No newline at end of file
+        Returns:
+            indices the laser passes through, each laser leaving the
+            block it hits, and the bitmask of the indices
+        """
+        width, height, cells = self.width, self.height, self.cells
+        key = (x, y, direction)
+        dx, dy = DIRECTIONS[direction]
+        points = []
+        new_lasers = []
+
+        while True:
+            # Move laser one step in its direction
+            x += dx
+            y += dy
+
+            # Check if laser went out of bounds
+            if not (0 <= x < width and 0 <= y < height):
+                break
+
+            index = y * width + x
+            points.append(index)
+
+            # Check for block interaction
+            code = cells[index]
+            if code:
+                outgoing = TRANSITIONS[code * len(DIRECTIONS) + direction]
+                if outgoing is None:
+                    raise ValueError("Unexpected laser entry point — not adjacent to block.")
+                new_lasers = [(x, y, new_direction) for new_direction in outgoing]
+                break
+
+        self.steps_traced += len(points)
+        ray = self._rays.get(key)
+        if ray is None:
+            ray = self._trace_ray(*key)
+        mask = ray[len(points)]
+        self._segments[key] = (points, new_lasers, mask)
+        for point in points:
+            self._point_segments.setdefault(point, set()).add(key)
+        return points, new_lasers, mask
+
+    def _trace_ray(self, x: int, y: int, direction: int) -> List[int]:
+        """
+        Follow a laser in a straight line to the edge of the board, through
+        any blocks, and store the bitmasks of its first steps.
+
+        Arguments:
+            x, y: starting point of the laser
+            direction: direction code of the laser
+
+        Returns:
+            list of the bitmasks of the first n indices the laser passes
+            through, by n
+        """
+        width, height = self.width, self.height
+        key = (x, y, direction)
+        dx, dy = DIRECTIONS[direction]
+        ray = [0]
+        while True:
+            x += dx
+            y += dy
+            if not (0 <= x < width and 0 <= y < height):
+                break
+            ray.append(ray[-1] | 1 << (y * width + x))
+        self._rays[key] = ray
+        return ray
+
+    def is_solved(self) -> bool:
+        """
+        Check if the current board configuration solves the puzzle.
+        The visited points are a bitmask, and the lasers of the remaining
+        sources are not followed once every target bit is set.
+
+        Returns:
+            true if all targets are hit by lasers, otherwise false
+        """
+        self.simulations += 1
+        target_mask = self._target_mask
+        visited = 0  # bitmask of the points visited by lasers
+        for source in self.lasers:
+            if visited & target_mask == target_mask:
+                return True
+            path = self._source_paths.get(source)
+            visited |= self._trace_source(source) if path is None else path
+        return visited & target_mask == target_mask
+
+
+# Folder next to the .bff files where parse_bff keeps the parsed boards,
+# like __pycache__ for Python files
+BFF_CACHE_DIR = '__bffcache__'
+# Header of a cached board: magic, modification time (ns) and size of the
+# .bff file it was parsed from; the bytes of Board.to_bytes follow
+BFF_CACHE_MAGIC = b'LZC1'
+BFF_CACHE_HEADER = struct.Struct('<4sQQ')
+
+
+def bff_cache_path(filename: str) -> str:
+    """
+    Get the path of the cached board of a .bff file.
+
+    Arguments:
+        filename: path to the .bff file
+
+    Returns:
+        path of the cache file in the BFF_CACHE_DIR next to the .bff file
+    """
+    folder, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(folder, BFF_CACHE_DIR, name + 'c')
+
+
+# def parse_bff(filename):
+def parse_bff(filename: str, use_cache: bool = True) -> tuple[List[List[str]], Board]:
+    '''
+    Parse a .bff file to create a Board object.
+    The parsed board is cached in binary form (see Board.to_bytes) in
+    BFF_CACHE_DIR next to the file, and loaded from there as long as the
+    modification time and size of the file have not changed. The cache
+    is skipped if it cannot be read or written.
+
+    Arguments:
+        filename: path to the .bff file
+        use_cache: False to always parse the text and leave the cache alone
+
+    Returns:
+        grid of the .bff letters and the Board object initialised with
+        the parsed data, as parse_bff_stream
+
+    Raises:
+        ValueError: raises error if the file is not a valid .bff file
+    '''
+    if not use_cache:
+        with open(filename, 'r') as f:
+            return parse_bff_stream(f, filename)
+
+    status = os.stat(filename)
+    header = BFF_CACHE_HEADER.pack(BFF_CACHE_MAGIC, status.st_mtime_ns, status.st_size)
+    cache_file = bff_cache_path(filename)
+    try:
+        with open(cache_file, 'rb') as f:
+            data = f.read()
+        if data.startswith(header):
+            board = Board.from_bytes(memoryview(data)[len(header):])
+            grid = board.grid_letters()
+            log_board(filename, grid, board)
+            return grid, board
+    except (OSError, ValueError):
+        pass  # no usable cache, parse the file
+
+    with open(filename, 'r') as f:
+        grid, board = parse_bff_stream(f, filename)
+
+    # Write to a temporary file first, so other processes never read a
+    # partly written cache. Boards with coordinates that do not fit the
+    # binary format (struct.error) are not cached
+    temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        data = header + board.to_bytes()
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(temporary_file, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_file, cache_file)
+    except (OSError, struct.error):
+        logger.debug("could not cache %s in %s", filename, cache_file)
+        with contextlib.suppress(OSError):
+            os.remove(temporary_file)
+    return grid, board
+
+
+# Letters allowed in the grid of a .bff file
+GRID_LETTERS = {'o', 'x'} | set(BLOCK_TYPES)
+
+
+def parse_bff_stream(source: Union[IO[str], IO[bytes], bytes, bytearray, memoryview],
+                     name: str = '<stream>') -> tuple[List[List[str]], Board]:
+    '''
+    Parse a .bff board one line at a time, checking each line as it is
+    read. Nothing is printed; a summary of the board is logged at DEBUG
+    level.
+
+    Arguments:
+        source: text stream, binary stream or bytes buffer of UTF-8 text
+        name: name of the source used in error messages
+
+    Returns:
+        grid of the .bff letters and the Board object initialised with
+        the parsed data
+
+    Raises:
+        ValueError: raises error if a line is not valid .bff
+    '''
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if isinstance(source, (io.RawIOBase, io.BufferedIOBase)):
+        # Decode each line rather than wrapping the stream in a
+        # TextIOWrapper, which would close the caller's stream with it
+        source = (line.decode('utf-8') for line in source)
+
+    grid = []
+    available_blocks = {'A': 0, 'B': 0, 'C': 0}
+    lasers = []
+    targets = []
+    read_grid = False
+
+    def fail(message):
+        raise ValueError(f"{name}, line {line_number}: {message}")
+
+    def numbers(parts, count):
+        if len(parts) != count + 1:
+            fail(f"{parts[0]} needs {count} numbers")
+        try:
+            return [int(part) for part in parts[1:]]
+        except ValueError:
+            fail(f"{parts[0]} needs {count} integers")
+
+    for line_number, line in enumerate(source, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):  # skip comments and empty lines
+            continue
+
+        if line == 'GRID START':
+            if read_grid or grid:
+                fail("second GRID START")
+            read_grid = True
+        elif line == 'GRID STOP':
+            if not read_grid:
+                fail("GRID STOP without GRID START")
+            read_grid = False
+        elif read_grid:
+            row = line.split()
+            if not GRID_LETTERS.issuperset(row):
+                fail(f"unknown grid letter in {line!r}")
+            if grid and len(row) != len(grid[0]):
+                fail(f"grid row has {len(row)} cells, expected {len(grid[0])}")
+            grid.append(row)
+        else:
+            parts = line.split()
+            instruction = parts[0]
+            if instruction in BLOCK_TYPES:
+                available_blocks[instruction], = numbers(parts, 1)
+            elif instruction == 'L':  # Laser in format L x y dx dy
+                lasers.append(numbers(parts, 4))
+            elif instruction == 'P':  # Target in format P x y
+                targets.append(numbers(parts, 2))
+            else:
+                fail(f"unknown instruction {instruction!r}")
+
+    if read_grid:
+        raise ValueError(f"{name}: GRID START without GRID STOP")
+    if not grid:
+        raise ValueError(f"{name}: no grid")
+
+    # Create the board, multiply by 2 to account for the fine grid
+    board = Board(len(grid[0]) * 2, len(grid) * 2)
+
+    # Add fixed blocks to the board
+    for y, row in enumerate(grid):
+        for x, cell in enumerate(row):
+            pos = Point(x * 2, y * 2)
+            if cell == 'o':  # Empty position where blocks can be placed
+                board.empty_positions.append(pos)
+            elif cell in BLOCK_TYPES:
+                board.add_block(BLOCK_TYPES[cell](pos, fixed=True))
+
+    board.available_blocks = available_blocks
+    for x, y, norm_dx, norm_dy in lasers:
+        board.add_laser(x, y, norm_dx, norm_dy)
+    for x, y in targets:
+        board.add_target(x, y)
+
+    log_board(name, grid, board)
+    return grid, board
+
+
+def log_board(name: str, grid: List[List[str]], board: Board) -> None:
+    '''
+    Log a summary of a parsed board at DEBUG level.
+
+    Arguments:
+        name: name of the .bff file or stream
+        grid: grid of the .bff letters
+        board: the parsed board
+    '''
+    logger.debug("%s: %dx%d grid, blocks %s, %d lasers, %d targets, %d empty positions, %d fixed blocks",
+                 name, len(grid), len(grid[0]), board.available_blocks, len(board.lasers),
+                 len(board.targets), len(board.empty_positions), len(board.grid))
+
+
+# Puzzle archive: a header, the board records one after the other, and an
+# index of fixed-size entries at the end, all little-endian
+ARCHIVE_MAGIC = b'LZA1'
+ARCHIVE_HEADER = struct.Struct('<4sIQ')  # magic, number of boards, offset of the index
+ARCHIVE_ENTRY = struct.Struct('<QHI')  # offset of the record, length of the name, length of the board
+
+
+def write_puzzle_archive(filename: str, boards: Iterable[tuple[str, Board]]) -> int:
+    """
+    Write boards to a puzzle archive that PuzzleArchive can read.
+    Each record is the UTF-8 name of the board followed by the bytes of
+    Board.to_bytes. Records are written as the boards come, so the
+    boards can be generated one at a time. The archive is written to a
+    temporary file that replaces filename once it is complete, so an
+    error part way leaves no archive behind.
+
+    Arguments:
+        filename: path of the archive to write
+        boards: (name, board) of each board, e.g. the .bff file name
+
+    Returns:
+        number of boards written
+    """
+    index = []
+    temporary_file = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_file, 'wb') as f:
+            f.write(bytes(ARCHIVE_HEADER.size))  # written once the index is known
+            for name, board in boards:
+                encoded_name = name.encode()
+                data = board.to_bytes()
+                index.append(ARCHIVE_ENTRY.pack(f.tell(), len(encoded_name), len(data)))
+                f.write(encoded_name)
+                f.write(data)
+            index_offset = f.tell()
+            f.write(b''.join(index))
+            f.seek(0)
+            f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, len(index), index_offset))
+        os.replace(temporary_file, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_file)
+        raise
+    return len(index)
+
+
+class PuzzleArchive:
+    """
+    Read-only puzzle archive written by write_puzzle_archive. The file is
+    memory-mapped and a board is only read when it is asked for, so large
+    archives are not loaded into memory. archive[i] returns the grid and
+    Board of the i-th board, as parse_bff does for a .bff file.
+    """
+    def __init__(self, filename: str) -> None:
+        """
+        Open a puzzle archive.
+
+        Arguments:
+            filename: path of the archive
+
+        Raises:
+            ValueError: raises error if the file is not a puzzle archive
+        """
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        try:
+            magic, self._count, self._index_offset = ARCHIVE_HEADER.unpack_from(self._view)
+        except struct.error:
+            magic = None
+        if magic != ARCHIVE_MAGIC or self._index_offset + self._count * ARCHIVE_ENTRY.size > len(self._view):
+            self.close()
+            raise ValueError(f"{filename} is not a puzzle archive")
+
+    def __enter__(self) -> 'PuzzleArchive':
+        """ Use the archive in a with statement, which closes it."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """ Close the archive at the end of the with statement."""
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the archive. Boards already read stay usable.
+        """
+        self._view.release()
+        self._map.close()
+
+    def __len__(self) -> int:
+        """ Number of boards in the archive."""
+        return self._count
+
+    def _entry(self, number: int) -> tuple[int, int, int]:
+        """
+        Read the index entry of a board.
+
+        Arguments:
+            number: position of the board in the archive
+
+        Returns:
+            offset of the record, length of the name and length of the board
+
+        Raises:
+            IndexError: raises error if there is no such board
+        """
+        if not -self._count <= number < self._count:
+            raise IndexError(f"board {number} out of range, the archive has {self._count}")
+        return ARCHIVE_ENTRY.unpack_from(self._view, self._index_offset + number % self._count * ARCHIVE_ENTRY.size)
+
+    def name(self, number: int) -> str:
+        """
+        Get the name of a board.
+
+        Arguments:
+            number: position of the board in the archive
+
+        Returns:
+            name the board was written with
+        """
+        offset, name_length, _ = self._entry(number)
+        return str(self._view[offset:offset + name_length], 'utf-8')
+
+    def __getitem__(self, number: int) -> tuple[List[List[str]], Board]:
+        """
+        Read a board.
+
+        Arguments:
+            number: position of the board in the archive
+
+        Returns:
+            grid of the .bff letters and the Board, as parse_bff
+        """
+        offset, name_length, length = self._entry(number)
+        start = offset + name_length
+        board = Board.from_bytes(self._view[start:start + length])
+        return board.grid_letters(), board
+
+    def __iter__(self) -> Iterator[tuple[List[List[str]], Board]]:
+        """ Read the boards one after the other."""
+        return (self[number] for number in range(self._count))
+
+
+@dataclass
+class SearchStats:
+    """
+    Counters of the work done by a solver search.
+    """
+    nodes: int = 0  # search nodes visited
+    leaves: int = 0  # complete boards evaluated
+    prunes: int = 0  # branches abandoned before all blocks were placed
+    simulations: int = 0  # laser simulations (partial or complete)
+    steps_traced: int = 0  # laser steps traced, not reused from earlier simulations
+    seconds: float = 0.0  # time spent searching
+
+
+# Progress callback of the solver: called with the search stats so far and
+# the estimated fraction of the search space that is left
+ProgressCallback = Callable[[SearchStats, float], None]
+
+
+class SearchCounters:
+    """
+    Keeps the SearchStats of a search up to date with the time spent and
+    the counters of its compact board since the search started, added to
+    what the stats held before.
+    """
+    def __init__(self, compact: CompactBoard, stats: SearchStats) -> None:
+        """
+        Start counting.
+
+        Arguments:
+            compact: CompactBoard being searched
+            stats: SearchStats to add the counters of the search to
+        """
+        self.compact = compact
+        self.stats = stats
+        self.base_stats = copy.copy(stats)
+        # Counters of the compact board when the search started
+        self.start = (time.perf_counter(), compact.simulations, compact.steps_traced)
+
+    def update(self) -> None:
+        """
+        Bring the counters taken from the compact board up to date.
+        """
+        self.stats.seconds = self.base_stats.seconds + time.perf_counter() - self.start[0]
+        self.stats.simulations = self.base_stats.simulations + self.compact.simulations - self.start[1]
+        self.stats.steps_traced = self.base_stats.steps_traced + self.compact.steps_traced - self.start[2]
+
+
+def blocks_to_place(compact: CompactBoard) -> dict[str, int]:
+    """
+    Get the available blocks of a compact board as counts per block type,
+    leaving out the types with no blocks, e.g. {'A': 2, 'C': 1}.
+    """
+    return {block_type: count for block_type, count in compact.available_blocks.items() if count > 0}
+
+
+def remove_placements(compact: CompactBoard, placements: Sequence[tuple[int, str]]) -> List[tuple[int, str]]:
+    """
+    Remove blocks placed by a search, leaving the compact board as it was
+    given.
+
+    Arguments:
+        compact: CompactBoard searched
+        placements: (index, block type) of the blocks placed
+
+    Returns:
+        a copy of placements
+    """
+    placed = list(placements)
+    for index, _ in placed:
+        compact.remove_block(index)
+    return placed
+
+
+def search_placements(compact: CompactBoard,
+                      placements: Sequence[tuple[int, str]] = (),
+                      decided_empty: Iterable[int] = (),
+                      stats: Optional[SearchStats] = None,
+                      progress: Optional[ProgressCallback] = None,
+                      progress_every: int = 10000) -> Optional[List[tuple[int, str]]]:
+    """
+    Search for block placements that solve a compact board.
+
+    Only positions that a laser actually reaches are decided: the search
+    picks an undecided position where a laser stops and either leaves it
+    empty or places one of the block types that still has blocks left.
+    Every distinct set of laser paths is therefore evaluated exactly once,
+    and a branch is abandoned as soon as the lasers can no longer reach a
+    missed target. Blocks left over once no laser reaches an undecided
+    position are spare blocks and go to any remaining empty position,
+    where they do not change the laser paths.
+
+    Two branches always differ in the contents of the position decided
+    where they split, so no board state is ever searched twice and there
+    is nothing for a transposition table of explored states to skip.
+
+    The search can start part way down the search tree, from blocks that
+    are already decided and positions already decided to stay empty. The
+    compact board is left as it was given.
+
+    The remaining fraction passed to progress is estimated by splitting
+    each node's share of the search space evenly between its branches and
+    adding up the shares of the branches already finished. An exception
+    raised by progress stops the search.
+
+    Arguments:
+        compact: CompactBoard to solve
+        placements: (index, block type) of blocks already decided
+        decided_empty: indices of positions already decided to stay empty
+        stats: SearchStats to add the counters of this search to
+        progress: function called every progress_every nodes
+        progress_every: number of nodes between progress calls
+
+    Returns:
+        (index, block type) of every block of the solution, or None if no
+        solution is found.
+    """
+
+    # Blocks left to place per block type
+    remaining = blocks_to_place(compact)
+    # Order in which positions are decided when several are reached
+    order = {index: rank for rank, index in enumerate(compact.empty_positions)}
+    # Empty positions that may still get a block
+    undecided = set(compact.empty_positions).difference(decided_empty)
+
+    solution = []  # (index, block type) of the solution blocks
+
+    if stats is None:
+        stats = SearchStats()
+    counters = SearchCounters(compact, stats)
+    finished = 0.0  # share of the search space already searched
+
+    def finish(share):
+        """
+        Record a finished branch and its share of the search space.
+        """
+        nonlocal finished
+        finished += share
+        return False
+
+    def place_block(index, block_type):
+        """
+        Place a block on the compact board and record it in the solution.
+        """
+        compact.add_block(index, BLOCK_CODES[block_type])
+        solution.append((index, block_type))
+        remaining[block_type] -= 1
+
+    def place_spare_blocks():
+        """
+        Place the remaining blocks on undecided positions no laser reaches.
+        """
+        spare_positions = sorted(undecided, key=order.__getitem__)
+        for block_type, count in remaining.items():
+            for _ in range(count):
+                place_block(spare_positions.pop(0), block_type)
+
+    # Backtracking function to check all combinations of blocks
+    def try_place(to_place, share):
+        """
+        Recursive function for block placements.
+
+        Arguments:
+            to_place: number of blocks that still have to be placed
+            share: fraction of the search space below this node
+
+        Returns:
+            True if a soludtion is found, otherwise False.
+        """
+        nonlocal undecided_mask
+        stats.nodes += 1
+        if progress is not None and stats.nodes % progress_every == 0:
+            counters.update()
+            progress(stats, 1.0 - finished)
+
+        if to_place == 0:
+            # Check if the board is solved with the current configuration
+            stats.leaves += 1
+            return compact.is_solved() or finish(share)
+
+        # Not enough positions left for the remaining blocks
+        if len(undecided) < to_place:
+            stats.prunes += 1
+            return finish(share)
+
+        visited, reached = compact.simulate_partial_lasers(undecided, undecided_mask)
+        if not reached:
+            # No later placement can change the laser paths, so the
+            # remaining blocks are spare
+            stats.leaves += 1
+            if visited & target_mask != target_mask:
+                return finish(share)
+            place_spare_blocks()
+            return True
+
+        # Give up on a missed target that no later beam can reach
+        missed = target_mask & ~visited
+        for bit, lines, diagonals in target_lines:
+            if (missed & bit and not lines & undecided_mask
+                    and diagonals.isdisjoint(reached)):
+                stats.prunes += 1
+                return finish(share)
+
+        index = min(reached, key=order.__getitem__)
+        undecided.remove(index)
+        undecided_mask ^= 1 << index
+
+        # Leaving the position empty is one more branch
+        branch_share = share / (1 + sum(1 for count in remaining.values() if count > 0))
+
+        # Try each block type that still has blocks left at this position
+        for block_type, count in remaining.items():
+            if count == 0:
+                continue
+
+            # Add the block to the board
+            place_block(index, block_type)
+
+            # Check if the board is valid with the current block placement
+            if try_place(to_place - 1, branch_share):
+                return True
+
+            # Remove the block if no solution
+            remaining[block_type] += 1
+            compact.remove_block(index)
+            solution.pop()
+
+        # Leave this position empty and move on
+        if try_place(to_place, branch_share):
+            return True
+        undecided.add(index)
+        undecided_mask ^= 1 << index
+        return False
+
+    for index, block_type in placements:
+        undecided.remove(index)
+        place_block(index, block_type)
+    # Bitmask of the undecided positions, kept in step with undecided
+    undecided_mask = 0
+    for index in undecided:
+        undecided_mask |= 1 << index
+
+    # Every beam still to come starts at an undecided position: a block
+    # placed there sends it along the row or column of the position, and
+    # a beam stopped there passes straight through if it stays empty.
+    # Blocks only ever turn a beam back along its own line, so a target
+    # can only be reached later from an undecided position on its row or
+    # column, or by a beam passing diagonally through a reached position.
+    # (bit, row and column mask, diagonal positions) of each target.
+    target_mask = compact.target_mask
+    target_lines = []
+    for target in compact.targets:
+        if target < 0:
+            target_lines.append((1 << compact.width * compact.height, 0, frozenset()))
+            continue
+        x, y = target % compact.width, target // compact.width
+        lines = 0
+        diagonals = set()
+        for index in compact.empty_positions:
+            dx, dy = index % compact.width - x, index // compact.width - y
+            if dx == 0 or dy == 0:
+                lines |= 1 << index
+            elif abs(dx) == abs(dy):
+                diagonals.add(index)
+        target_lines.append((1 << target, lines, frozenset(diagonals)))
+
+    found = try_place(sum(remaining.values()), 1.0)
+    counters.update()
+
+    placed = remove_placements(compact, solution)
+    return placed if found else None
+
+
+def search_placements_backward(compact: CompactBoard,
+                               stats: Optional[SearchStats] = None) -> Optional[List[tuple[int, str]]]:
+    """
+    Search for block placements that solve a compact board, reasoning
+    backward from the targets.
+
+    A laser passing a point travels in a straight line from where it
+    started: a laser source, or a block that sent it in that direction.
+    For a missed target the search walks back along every direction from
+    it. Each laser source found on the way explains the target, and each
+    block position, with a block that can send a laser towards the target,
+    explains it if a laser hits that block from the right direction, which
+    is found the same way. The empty positions walked over must stay empty.
+    Blocks are only placed where such a chain of lasers from a source to a
+    target needs them. Once every target is explained, the lasers of the
+    chains hit all targets whatever happens elsewhere, so the remaining
+    blocks go to any empty position that does not have to stay empty.
+
+    The compact board is left as it was given.
+
+    Arguments:
+        compact: CompactBoard to solve
+        stats: SearchStats to add the counters of this search to
+
+    Returns:
+        (index, block type) of every block of the solution, or None if no
+        solution is found.
+    """
+    if stats is None:
+        stats = SearchStats()
+    counters = SearchCounters(compact, stats)
+
+    remaining = blocks_to_place(compact)
+    order = {index: rank for rank, index in enumerate(compact.empty_positions)}
+    undecided = set(compact.empty_positions)
+    sources = set(compact.lasers)
+    width, height = compact.width, compact.height
+    # Area where lasers can start, the board and every laser source
+    min_x = min([0] + [x for x, _, _ in sources]) - 1
+    max_x = max([width] + [x for x, _, _ in sources]) + 1
+    min_y = min([0] + [y for _, y, _ in sources]) - 1
+    max_y = max([height] + [y for _, y, _ in sources]) + 1
+
+    solution = []  # (index, block type) of the solution blocks
+
+    def place_block(index, block_type):
+        """
+        Place a block on the compact board and record it in the solution.
+        """
+        compact.add_block(index, BLOCK_CODES[block_type])
+        solution.append((index, block_type))
+        remaining[block_type] -= 1
+        undecided.remove(index)
+
+    def remove_block(index, block_type):
+        """
+        Undo place_block.
+        """
+        compact.remove_block(index)
+        solution.pop()
+        remaining[block_type] += 1
+        undecided.add(index)
+
+    def finish():
+        """
+        Place the remaining blocks once every target is hit.
+        """
+        stats.leaves += 1
+        to_place = sum(remaining.values())
+        if len(undecided) < to_place:
+            stats.prunes += 1
+            return False
+
+        spare_positions = sorted(undecided, key=order.__getitem__)
+        spare_types = [block_type for block_type, count in remaining.items() for _ in range(count)]
+        placed = list(zip(spare_positions, spare_types))
+        for index, block_type in placed:
+            place_block(index, block_type)
+
+        # The chains of lasers hit every target, checked here to be safe
+        if compact.is_solved():
+            return True
+        for index, block_type in reversed(placed):
+            remove_block(index, block_type)
+        return False
+
+    def explain_targets():
+        """
+        Explain the next missed target, then the ones after it.
+        """
+        stats.nodes += 1
+        visited, _ = compact.simulate_partial_lasers(undecided)
+        missed = [target for target in compact.targets if target < 0 or not visited >> target & 1]
+        if not missed:
+            return finish()
+        target = min(missed)
+        if target < 0:
+            # A target off the board can never be hit
+            return False
+        return explain(target % width, target // width, range(len(DIRECTIONS)), frozenset(), explain_targets)
+
+    def explain(x, y, directions, chain, then):
+        """
+        Try every way for a laser to pass a point in one of some directions,
+        calling then() for each until it returns True.
+
+        Arguments:
+            x, y: point the laser has to pass
+            directions: direction codes the laser may travel in
+            chain: (index, direction code) of each block already sending a
+                laser in this chain, so the chain never loops
+            then: function that continues the search
+
+        Returns:
+            True if a solution is found, otherwise False.
+        """
+        stats.nodes += 1
+        for direction in directions:
+            dx, dy = DIRECTIONS[direction]
+            if dx == 0 and dy == 0:
+                continue
+            decided_empty = []  # undecided positions the laser has to cross
+            found = False
+            origin_x, origin_y = x - dx, y - dy
+
+            while min_x <= origin_x <= max_x and min_y <= origin_y <= max_y:
+                # A laser source sending the laser this way
+                if (origin_x, origin_y, direction) in sources and then():
+                    found = True
+                    break
+
+                if not (0 <= origin_x < width and 0 <= origin_y < height):
+                    origin_x, origin_y = origin_x - dx, origin_y - dy
+                    continue
+                index = origin_y * width + origin_x
+
+                # A block already on the board sending the laser this way
+                code = compact.cells[index]
+                if code:
+                    incoming = INCOMING[code * len(DIRECTIONS) + direction]
+                    if incoming and (index, direction) not in chain and explain(
+                            origin_x, origin_y, incoming, chain | {(index, direction)}, then):
+                        found = True
+                    break
+
+                if index in undecided:
+                    # A new block sending the laser this way
+                    for block_type, count in list(remaining.items()):
+                        incoming = INCOMING[BLOCK_CODES[block_type] * len(DIRECTIONS) + direction]
+                        if count == 0 or not incoming:
+                            continue
+                        place_block(index, block_type)
+                        if explain(origin_x, origin_y, incoming, chain | {(index, direction)}, then):
+                            found = True
+                            break
+                        remove_block(index, block_type)
+                    if found:
+                        break
+
+                    # Otherwise the position has to stay empty for the laser to pass
+                    undecided.remove(index)
+                    decided_empty.append(index)
+
+                origin_x, origin_y = origin_x - dx, origin_y - dy
+
+            if found:
+                return True
+            undecided.update(decided_empty)
+
+        stats.prunes += 1
+        return False
+
+    found = explain_targets()
+    counters.update()
+
+    placed = remove_placements(compact, solution)
+    return placed if found else None
+
+
+def search_placements_sat(compact: CompactBoard,
+                          stats: Optional[SearchStats] = None) -> Optional[List[tuple[int, str]]]:
+    """
+    Search for block placements that solve a compact board with a SAT
+    solver (python-sat, pip install python-sat).
+
+    Every laser that can appear on the board, whatever the placement, is
+    traced once. There is a boolean variable for each block type at each
+    empty position, a variable for each laser telling whether it is
+    active, and one for each way a laser can start another at a block.
+    The clauses say that
+        each empty position gets at most one block and every available
+        block is placed,
+        a laser is active only if it is a laser source or an active laser
+        starts it at a block, reaching the block through empty positions,
+        every target is reached by an active laser through empty positions.
+    Lasers can still be active in a loop of lasers starting each other
+    with no laser source. Each placement the solver finds is checked on
+    the compact board, and when it fails, the set of lasers the solver
+    took as active but that are not is excluded: one of them can only be
+    active if a laser outside the set starts it (a loop formula). This is
+    repeated until a placement solves the board or no placement is left.
+
+    The compact board is left as it was given.
+
+    Arguments:
+        compact: CompactBoard to solve
+        stats: SearchStats to add the counters of this search to
+
+    Returns:
+        (index, block type) of every block of the solution, or None if no
+        solution is found.
+
+    Raises:
+        ImportError: raises error if python-sat is not installed
+    """
+    if SatSolver is None:
+        raise ImportError("The 'sat' strategy needs python-sat: pip install python-sat")
+    if stats is None:
+        stats = SearchStats()
+    counters = SearchCounters(compact, stats)
+
+    width, height, cells = compact.width, compact.height, compact.cells
+    remaining = blocks_to_place(compact)
+    slots = set(compact.empty_positions)
+    sources = set(compact.lasers)
+    if sum(remaining.values()) > len(slots):
+        stats.prunes += 1
+        counters.update()
+        return None
+
+    # Trace every laser that can appear: its steps and, for each step at a
+    # block or empty position, the lasers it starts there
+    beams = {}  # laser -> (indices passed through, [(step, block type or None, new laser)])
+    pending = list(sources)
+    while pending:
+        laser = pending.pop()
+        if laser in beams:
+            continue
+        x, y, direction = laser
+        dx, dy = DIRECTIONS[direction]
+        steps, starts = [], []
+        beams[laser] = (steps, starts)
+        while dx or dy:
+            x += dx
+            y += dy
+            if not (0 <= x < width and 0 <= y < height):
+                break
+            index = y * width + x
+            steps.append(index)
+            code = cells[index]
+            if code:
+                for new_direction in TRANSITIONS[code * len(DIRECTIONS) + direction] or ():
+                    starts.append((len(steps) - 1, None, (x, y, new_direction)))
+                break
+            if index in slots:
+                for block_type in remaining:
+                    outgoing = TRANSITIONS[BLOCK_CODES[block_type] * len(DIRECTIONS) + direction]
+                    for new_direction in outgoing or ():
+                        starts.append((len(steps) - 1, block_type, (x, y, new_direction)))
+        for _, _, new_laser in starts:
+            pending.append(new_laser)
+
+    pool = IDPool()
+    clauses = []
+    block_var = {(index, block_type): pool.id(('block', index, block_type))
+                 for index in slots for block_type in remaining}
+    active_var = {laser: pool.id(('active', laser)) for laser in beams}
+    true_var = pool.id('true')
+    clauses.append([true_var])
+
+    # Each empty position gets at most one block, and every block is placed
+    for index in slots:
+        clauses.extend(CardEnc.atmost([block_var[index, block_type] for block_type in remaining],
+                                      1, vpool=pool, encoding=EncType.pairwise).clauses)
+    for block_type, count in remaining.items():
+        clauses.extend(CardEnc.equals([block_var[index, block_type] for index in slots],
+                                      count, vpool=pool, encoding=EncType.seqcounter).clauses)
+
+    # open_vars[laser][step]: the laser gets to the step, every empty
+    # position before it has no block
+    open_vars = {}
+    for laser, (steps, _) in beams.items():
+        opened = [true_var]
+        for index in steps[:-1]:
+            if index in slots:
+                variable = pool.id(('open', laser, len(opened)))
+                clauses.append([-variable, opened[-1]])
+                clauses.extend([-variable, -block_var[index, block_type]] for block_type in remaining)
+                opened.append(variable)
+            else:
+                opened.append(opened[-1])
+        open_vars[laser] = opened
+
+    # A laser is active only if it is a laser source or started by an
+    # active laser
+    start_vars = {laser: [] for laser in beams}  # laser -> [(variable, laser starting it)]
+    for laser, (steps, starts) in beams.items():
+        for step, block_type, new_laser in starts:
+            variable = pool.id(('start', laser, step, block_type, new_laser))
+            clauses.append([-variable, active_var[laser]])
+            clauses.append([-variable, open_vars[laser][step]])
+            if block_type is not None:
+                clauses.append([-variable, block_var[steps[step], block_type]])
+            start_vars[new_laser].append((variable, laser))
+    for laser in beams:
+        if laser not in sources:
+            clauses.append([-active_var[laser]] + [variable for variable, _ in start_vars[laser]])
+
+    # Every target is reached by an active laser
+    for target in compact.targets:
+        reached = []
+        for laser, (steps, _) in beams.items():
+            for step, index in enumerate(steps):
+                if index == target:
+                    variable = pool.id(('reach', laser, step))
+                    clauses.append([-variable, active_var[laser]])
+                    clauses.append([-variable, open_vars[laser][step]])
+                    reached.append(variable)
+        clauses.append(reached)
+
+    placements = None
+    with SatSolver(name='cadical153', bootstrap_with=clauses) as sat:
+        while sat.solve():
+            stats.nodes += 1
+            model = set(lit for lit in sat.get_model() if lit > 0)
+            placed = [(index, block_type) for (index, block_type), variable in block_var.items()
+                      if variable in model]
+            placed.sort(key=lambda block: compact.empty_positions.index(block[0]))
+
+            stats.leaves += 1
+            for index, block_type in placed:
+                compact.add_block(index, BLOCK_CODES[block_type])
+            solved = compact.is_solved()
+            remove_placements(compact, placed)
+            if solved:
+                placements = placed
+                break
+
+            # Lasers that are active with these blocks
+            blocks = dict(placed)
+            active = set()
+            pending = list(sources)
+            while pending:
+                laser = pending.pop()
+                if laser in active:
+                    continue
+                active.add(laser)
+                steps, starts = beams[laser]
+                for step, block_type, new_laser in starts:
+                    if blocks.get(steps[step]) == block_type and \
+                            not any(index in blocks for index in steps[:step]):
+                        pending.append(new_laser)
+
+            stats.prunes += 1
+            unfounded = {laser for laser in beams if active_var[laser] in model} - active
+            if not unfounded:
+                # Cannot happen with the clauses above, exclude the placement to be safe
+                sat.add_clause([-block_var[block] for block in placed])
+                continue
+            outside = [variable for laser in unfounded
+                       for variable, starting in start_vars[laser] if starting not in unfounded]
+            for laser in unfounded:
+                sat.add_clause([-active_var[laser]] + outside)
+
+    counters.update()
+    return placements
+
+
+def evaluate_batch(compact: CompactBoard, candidates) -> 'np.ndarray':
+    """
+    Check many block layouts of a compact board at once with NumPy.
+    The lasers of every candidate are advanced one step at a time
+    together, as flat arrays of (candidate, x, y, direction code), and
+    block interactions are looked up in a table built from TRANSITIONS.
+
+    Arguments:
+        compact: CompactBoard giving the size, lasers and targets
+        candidates: integer array (candidates x width * height) of the
+            block code at each index of each candidate layout
+
+    Returns:
+        boolean array, true for each candidate that solves the board
+
+    Raises:
+        ImportError: raises error if NumPy is not installed
+        ValueError: raises error if a laser enters a block diagonally
+    """
+    if np is None:
+        raise ImportError("Batch evaluation needs NumPy: pip install numpy")
+    cells = np.asarray(candidates, dtype=np.uint8)
+    count, size = cells.shape
+    width, height = compact.width, compact.height
+    if -1 in compact.targets:
+        # A target off the board can never be hit
+        return np.zeros(count, dtype=bool)
+
+    # Outgoing direction codes for each code * len(DIRECTIONS) + direction,
+    # -1 where there are fewer than two
+    outgoing = np.full((len(TRANSITIONS), 2), -1, dtype=np.int64)
+    blocked = np.zeros(len(outgoing), dtype=bool)  # diagonal lasers entering a block
+    for key, directions in enumerate(TRANSITIONS):
+        if directions is None:
+            blocked[key] = True
+        else:
+            outgoing[key, :len(directions)] = directions
+    step_x = np.array([dx for dx, _ in DIRECTIONS])
+    step_y = np.array([dy for _, dy in DIRECTIONS])
+
+    visited = np.zeros((count, size), dtype=bool)
+    # Lasers already started at each index in each direction, to avoid infinite loops
+    started = np.zeros((count, size * len(DIRECTIONS)), dtype=bool)
+    sources = [laser for laser in dict.fromkeys(compact.lasers) if DIRECTIONS[laser[2]] != (0, 0)]
+    candidate = np.repeat(np.arange(count), len(sources))
+    x = np.tile(np.array([x for x, _, _ in sources], dtype=np.int64), count)
+    y = np.tile(np.array([y for _, y, _ in sources], dtype=np.int64), count)
+    direction = np.tile(np.array([d for _, _, d in sources], dtype=np.int64), count)
+
+    while candidate.size:
+        # Move every laser one step and drop the ones leaving the board
+        x = x + step_x[direction]
+        y = y + step_y[direction]
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        candidate, x, y, direction = candidate[inside], x[inside], y[inside], direction[inside]
+        index = y * width + x
+        visited[candidate, index] = True
+
+        code = cells[candidate, index]
+        hit = code != 0
+        if not hit.any():
+            continue
+        key = code[hit].astype(np.int64) * len(DIRECTIONS) + direction[hit]
+        if blocked[key].any():
+            raise ValueError("Unexpected laser entry point — not adjacent to block.")
+
+        # Lasers leaving the blocks hit, in up to two directions each
+        new_candidate = np.concatenate([candidate[hit]] * 2)
+        new_x = np.concatenate([x[hit]] * 2)
+        new_y = np.concatenate([y[hit]] * 2)
+        new_direction = np.concatenate([outgoing[key, 0], outgoing[key, 1]])
+        start = np.concatenate([index[hit]] * 2) * len(DIRECTIONS) + new_direction
+        new = (new_direction >= 0) & ~started[new_candidate, np.maximum(start, 0)]
+        started[new_candidate[new], start[new]] = True
+
+        moving = ~hit
+        candidate = np.concatenate([candidate[moving], new_candidate[new]])
+        x = np.concatenate([x[moving], new_x[new]])
+        y = np.concatenate([y[moving], new_y[new]])
+        direction = np.concatenate([direction[moving], new_direction[new]])
+
+    return visited[:, sorted(compact.targets)].all(axis=1)
+
+
+def search_placements_batch(compact: CompactBoard,
+                            stats: Optional[SearchStats] = None,
+                            batch_size: int = 4096) -> Optional[List[tuple[int, str]]]:
+    """
+    Search for block placements that solve a compact board by trying
+    every placement of the available blocks, batch_size placements at a
+    time with evaluate_batch (needs NumPy).
+
+    This is the exhaustive search of the original solver without any
+    pruning, so it only pays off on boards small enough to enumerate.
+
+    Arguments:
+        compact: CompactBoard to solve
+        stats: SearchStats to add the counters of this search to
+        batch_size: number of placements checked together
+
+    Returns:
+        (index, block type) of every block of the solution, or None if no
+        solution is found.
+
+    Raises:
+        ImportError: raises error if NumPy is not installed
+    """
+    if np is None:
+        raise ImportError("The 'batch' strategy needs NumPy: pip install numpy")
+    if stats is None:
+        stats = SearchStats()
+    time_start = time.perf_counter()
+
+    blocks = [block_type for block_type, count in compact.available_blocks.items() for _ in range(count)]
+
+    def placements(positions, block_types):
+        """
+        Yield every placement of some block types on some positions, each
+        once, as (index, block type) lists.
+        """
+        if not block_types:
+            yield []
+            return
+        block_type = block_types[0]
+        count = block_types.count(block_type)
+        for chosen in itertools.combinations(positions, count):
+            left = [index for index in positions if index not in chosen]
+            for rest in placements(left, block_types[count:]):
+                yield [(index, block_type) for index in chosen] + rest
+
+    base = np.frombuffer(bytes(compact.cells), dtype=np.uint8)
+    all_placements = placements(compact.empty_positions, blocks)
+    found = None
+    while found is None:
+        batch = list(itertools.islice(all_placements, batch_size))
+        if not batch:
+            break
+        candidates = np.tile(base, (len(batch), 1))
+        for row, placement in enumerate(batch):
+            for index, block_type in placement:
+                candidates[row, index] = BLOCK_CODES[block_type]
+        solved = evaluate_batch(compact, candidates)
+        stats.nodes += 1
+        stats.leaves += len(batch)
+        stats.simulations += len(batch)
+        if solved.any():
+            found = batch[int(solved.argmax())]
+
+    stats.seconds += time.perf_counter() - time_start
+    return found
+
+
+# Search functions of the solver strategies
+STRATEGIES = {'forward': search_placements, 'backward': search_placements_backward,
+              'sat': search_placements_sat, 'batch': search_placements_batch}
+
+
+# Solution cache file used by the command line, in the working directory
+SOLUTION_CACHE_FILE = 'lazor_solutions.sqlite'
+
+# Version of the cached results, stored as the user_version of the SQLite
+# file. Raise it whenever a solver change could turn a cached "no
+# solution" wrong, and caches written before are emptied when opened
+SOLUTION_CACHE_VERSION = 1
+
+
+def board_key(board: Board) -> str:
+    """
+    Get a canonical hash of a board to solve: its size, blocks, empty
+    positions, block counts, lasers and targets, whatever order they were
+    added in. Boards with the same key have the same solutions.
+
+    Mirrored or rotated boards get different keys: blocks sit at even
+    points 0 to width - 2 while lasers reach width - 1 but not -1, so
+    the edges of the board are not symmetric and a mirrored board is not
+    always an equivalent puzzle.
+
+    Arguments:
+        board: Board object to hash
+
+    Returns:
+        hexadecimal hash
+    """
+    state = (board.width, board.height,
+             sorted((tuple(pos), board.block_letter(pos)) for pos in board.grid),
+             sorted(tuple(pos) for pos in board.empty_positions),
+             sorted(board.available_blocks.items()),
+             sorted((tuple(laser.origin), tuple(laser.direction)) for laser in board.lasers),
+             sorted(tuple(pos) for pos in board.targets))
+    return hashlib.blake2b(repr(state).encode(), digest_size=16).hexdigest()
+
+
+class SolutionCache:
+    """
+    Persistent cache of solved boards in an SQLite file, keyed by
+    board_key. Boards with no solution are cached too.
+    """
+    def __init__(self, filename: str = SOLUTION_CACHE_FILE) -> None:
+        """
+        Open the cache, creating the file if needed.
+
+        Arguments:
+            filename: path of the SQLite file
+        """
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, timeout=30)
+        # With write-ahead logging, worker processes sharing the file read
+        # while another one writes, instead of waiting for its lock
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            # blocks is a JSON list of [x, y, block type], or NULL for no solution
+            self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, blocks TEXT)")
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != SOLUTION_CACHE_VERSION:
+                self.connection.execute("DELETE FROM solutions")
+                self.connection.execute(f"PRAGMA user_version = {SOLUTION_CACHE_VERSION}")
+
+    def __enter__(self) -> 'SolutionCache':
+        """ Use the cache in a with statement, which closes it."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """ Close the cache at the end of the with statement."""
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the SQLite file.
+        """
+        self.connection.close()
+
+    def get(self, key: str) -> tuple[bool, Optional[List[tuple[int, int, str]]]]:
+        """
+        Look up a board.
+
+        Arguments:
+            key: board_key of the board
+
+        Returns:
+            whether the board is cached, and the (x, y, block type) of the
+            blocks of its solution, or None if it has no solution
+        """
+        row = self.connection.execute("SELECT blocks FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        if row[0] is None:
+            return True, None
+        return True, [(x, y, block_type) for x, y, block_type in json.loads(row[0])]
+
+    def put(self, key: str, blocks: Optional[List[tuple[int, int, str]]]) -> None:
+        """
+        Store the solution of a board.
+
+        Arguments:
+            key: board_key of the board
+            blocks: (x, y, block type) of the blocks of the solution, or
+                None if the board has no solution
+        """
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?)",
+                                    (key, None if blocks is None else json.dumps(blocks)))
+
+
+# SolutionCache of each file opened by this process, see open_solution_cache
+_solution_caches: dict[str, SolutionCache] = {}
+
+
+def open_solution_cache(filename: str) -> SolutionCache:
+    """
+    Get the SolutionCache of a file, opened the first time this process
+    asks for it and kept open after that. Closing an SQLite file writes
+    its log back into it, which takes far longer than solving most
+    boards, so worker processes keep one connection for all their boards.
+
+    Arguments:
+        filename: path of the SQLite file
+
+    Returns:
+        the open SolutionCache
+    """
+    cache = _solution_caches.get(filename)
+    if cache is None:
+        cache = _solution_caches[filename] = SolutionCache(filename)
+    return cache
+
+
+# def solver(board):
+def solver(board: Board,
+           stats: Optional[SearchStats] = None,
+           progress: Optional[ProgressCallback] = None,
+           progress_every: int = 10000,
+           strategy: str = 'forward',
+           cache: Optional[SolutionCache] = None) -> Optional[List[Block]]:
+    """
+    Solve the Lazor game by finding a valid block placement.
+    The search runs on a CompactBoard copy of the board and the blocks of
+    a solution are added to board. With a cache, a board solved before is
+    answered from the cache (cached solutions are checked on the board
+    first), and new results are added to it.
+
+    Arguments:
+        board: Board object to solve
+        stats: SearchStats that receives the counters of the search
+        progress: function called every progress_every nodes with the
+            stats so far and the estimated fraction of the search left
+            (forward strategy only)
+        progress_every: number of nodes between progress calls
+        strategy: 'forward' to place blocks where the lasers go (see
+            search_placements), 'backward' to reason back from the
+            targets (see search_placements_backward), 'sat' to use a
+            SAT solver (see search_placements_sat, needs python-sat), or
+            'batch' to try every placement with NumPy (see
+            search_placements_batch)
+        cache: SolutionCache to look the board up in and store the result
+        
+    Returns:
+        List of blocks that make the board solvable, or None if no solution is found.
+
+    Raises:
+        ValueError: raises error if the strategy is unknown, or if progress
+            is given with a strategy other than 'forward'
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, use one of {list(STRATEGIES)}")
+    if progress is not None and strategy != 'forward':
+        raise ValueError(f"Strategy {strategy!r} does not report progress, only 'forward' does")
+
+    if cache is not None:
+        key = board_key(board)
+        cached, blocks = cache.get(key)
+        if cached and blocks is None:
+            return None
+        if cached:
+            solution = place_cached_solution(board, blocks)
+            if solution is not None:
+                return solution
+
+    compact = CompactBoard.from_board(board)
+    if strategy == 'forward':
+        placements = search_placements(compact, stats=stats,
+                                       progress=progress, progress_every=progress_every)
+    else:
+        placements = STRATEGIES[strategy](compact, stats=stats)
+
+    solution = None if placements is None else place_solution(board, placements)
+    if cache is not None:
+        cache.put(key, None if solution is None else [(block.pos.x, block.pos.y, board.block_letter(block.pos))
+                                                       for block in solution])
+    return solution
+
+
+def place_cached_solution(board: Board, blocks: List[tuple[int, int, str]]) -> Optional[List[Block]]:
+    """
+    Add the blocks of a cached solution to a board, if they are a valid
+    solution of it: one block on each of distinct empty positions, the
+    available blocks exactly, and all targets hit. The board is left as
+    it was otherwise.
+
+    Arguments:
+        board: Board object to solve
+        blocks: (x, y, block type) of the cached blocks
+
+    Returns:
+        List of the blocks added, or None if they do not solve the board
+    """
+    positions = [Point(x, y) for x, y, _ in blocks]
+    free = set(board.empty_positions).difference(board.grid)
+    counts = collections.Counter(block_type for _, _, block_type in blocks)
+    if (len(set(positions)) != len(positions) or not free.issuperset(positions)
+            or counts != collections.Counter(board.available_blocks)):
+        return None
+
+    solution = []
+    for pos, (_, _, block_type) in zip(positions, blocks):
+        block = BLOCK_TYPES[block_type](pos)
+        board.add_block(block)
+        solution.append(block)
+    if board.is_solved():
+        return solution
+    for block in solution:
+        board.remove_block(block.pos)
+    return None
+
+
+def place_solution(board: Board, placements: List[tuple[int, str]]) -> List[Block]:
+    """
+    Add the blocks found on a compact board to the original board.
+
+    Arguments:
+        board: Board object the compact board was made from
+        placements: (index, block type) of the solution blocks
+
+    Returns:
+        List of the blocks added to the board
+    """
+    solution = []
+    for index, block_type in placements:
+        block = BLOCK_TYPES[block_type](Point(index % board.width, index // board.width))
+        board.add_block(block)
+        solution.append(block)
+    return solution
+
+
+def subtree_size(compact: CompactBoard, placements: Sequence[tuple[int, str]], decided_empty: Sequence[int]) -> int:
+    """
+    Estimate the size of a search subtree as the number of ways to place
+    the blocks left on the positions left undecided.
+    """
+    remaining = dict(compact.available_blocks)
+    for _, block_type in placements:
+        remaining[block_type] -= 1
+    undecided = len(compact.empty_positions) - len(placements) - len(decided_empty)
+    size = 1
+    for block_count in remaining.values():
+        if block_count > undecided:
+            return 0
+        size *= math.comb(undecided, block_count)
+        undecided -= block_count
+    return size
+
+
+def split_search(compact: CompactBoard, count: int) -> List[tuple[List[tuple[int, str]], List[int]]]:
+    """
+    Split the search tree of search_placements into independent subtrees
+    by making its first decisions up front. Subtrees are split in
+    breadth-first order until there are at least count of them, or none
+    of them has a decision left to make.
+
+    Arguments:
+        compact: CompactBoard to solve
+        count: number of subtrees wanted
+
+    Returns:
+        list of (placements, decided_empty) starting points for
+        search_placements, covering the whole search tree
+    """
+    order = {index: rank for rank, index in enumerate(compact.empty_positions)}
+    pending = [(0, 0, [], [])]
+    subtrees = []
+    tie = itertools.count(1)
+
+    while pending and len(pending) + len(subtrees) < count:
+        _, _, placements, decided_empty = heapq.heappop(pending)
+        remaining = dict(compact.available_blocks)
+        for index, block_type in placements:
+            remaining[block_type] -= 1
+        to_place = sum(remaining.values())
+        undecided = set(compact.empty_positions).difference(decided_empty)
+        undecided.difference_update(index for index, _ in placements)
+
+        # Find the position the search would decide next
+        for index, block_type in placements:
+            compact.add_block(index, BLOCK_CODES[block_type])
+        _, reached = compact.simulate_partial_lasers(undecided)
+        remove_placements(compact, placements)
+
+        # Nothing left to decide, search_placements finishes this one
+        if to_place == 0 or len(undecided) < to_place or not reached:
+            subtrees.append((placements, decided_empty))
+            continue
+
+        index = min(reached, key=order.__getitem__)
+        branches = [(placements + [(index, block_type)], decided_empty)
+                    for block_type, block_count in remaining.items() if block_count > 0]
+        branches.append((placements, decided_empty + [index]))
+        for branch in branches:
+            heapq.heappush(pending, (-subtree_size(compact, *branch), next(tie)) + branch)
+
+    return subtrees + [(placements, decided_empty) for _, _, placements, decided_empty in sorted(pending)]
+
+
+# CompactBoard of the puzzle solved by a parallel_solver worker process
+_worker_board: Optional[CompactBoard] = None
+
+
+def _init_worker(compact: CompactBoard) -> None:
+    """
+    Store the board to solve in a parallel_solver worker process.
+
+    Arguments:
+        compact: CompactBoard to solve
+    """
+    global _worker_board
+    _worker_board = compact
+
+
+def _search_subtree(subtree: tuple[List[tuple[int, str]], List[int]]) -> Optional[List[tuple[int, str]]]:
+    """
+    Search one subtree from split_search in a worker process.
+
+    Arguments:
+        subtree: (placements, decided_empty) starting point
+
+    Returns:
+        (index, block type) of the solution blocks, or None
+    """
+    placements, decided_empty = subtree
+    return search_placements(_worker_board, placements, decided_empty)
+
+
+def parallel_solver(board: Board, workers: Optional[int] = None,
+                    subtrees_per_worker: int = 16) -> Optional[List[Block]]:
+    """
+    Solve the Lazor game like solver, searching subtrees of the search
+    tree in parallel worker processes. The tree is split into several
+    subtrees per worker, so that a worker which finishes a small subtree
+    picks up another one instead of waiting on the largest. Each worker
+    gets the compact board once, and all workers are stopped as soon as
+    one of them finds a solution.
+
+    Arguments:
+        board: Board object to solve
+        workers: number of worker processes, defaults to the number of CPUs
+        subtrees_per_worker: number of subtrees to split the search into
+            for each worker
+
+    Returns:
+        List of blocks that make the board solvable, or None if no solution is found.
+    """
+    compact = CompactBoard.from_board(board)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    subtrees = split_search(compact, workers * subtrees_per_worker)
+
+    placements = None
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(compact,)) as pool:
+        for result in pool.imap_unordered(_search_subtree, subtrees):
+            if result is not None:
+                placements = result
+                break
+        # Leaving the with block terminates the workers still searching
+
+    if placements is None:
+        return None
+    return place_solution(board, placements)
+
+
+def save_solution(board: Union[Board, CompactBoard], grid: List[List[str]], filename: str) -> None:
+    """
+    Save the solution into a file with the original grid format.
+    'o' is replaced with the block type used in the solution.
+
+    Arguments:
+        board: Board or CompactBoard object with the solution
+        grid: original grid layout in bff file
+        filename: path to save the solution file as {original}_solution.bff
+    """
+    with open(filename, 'w') as f:
+        f.write("GRID START\n")
+
+        # Start going through each row of the grid
+        for y, row in enumerate(grid):
+            solution_row = []  # To store the row of the solution
+
+            # Go through each cell in the row
+            for x, cell in enumerate(row):
+                pos = Point(x * 2, y * 2)  # Get the position in the fine grid
+
+
+                if cell == 'x':
+                    solution_row.append('x')
+                elif cell == 'o':
+                    # Get the type of the block placed at the position
+                    letter = board.block_letter(pos)
+                    if letter is not None:
+                        solution_row.append(letter)
+                    else:
+                        solution_row.append('o')  # If no functional block is placed, keep it as 'o'
+                else:
+                    solution_row.append(cell)  #  Keep the original block type if no change occured
+            
+            #Write the solution row to the file with space between each cell
+            f.write(' '.join(solution_row) + '\n')
+
+        # Finish the file with GRID STOP
+        f.write("GRID STOP\n")
+
+
+# Upper bounds in seconds of the PhaseProfiler histogram buckets
+HISTOGRAM_BOUNDS = [1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0]
+# Environment variable that switches profiling on: 'histogram' or 'cprofile'
+PROFILE_VARIABLE = 'LAZOR_PROFILE'
+PROFILE_MODES = ('histogram', 'cprofile')
+
+
+class PhaseProfiler:
+    """
+    Lightweight profiler that times the hot phases of simulating and
+    solving, and keeps a histogram of the call times of each phase.
+    The timing hooks are only installed between enable() and disable(), so
+    the code runs unchanged when profiling is off. Times are inclusive:
+    is_solved includes the laser segments it traces. The search itself is timed
+    as a whole through search_placements, since its try_place is a nested
+    function; SearchStats counts its nodes.
+    """
+    def __init__(self) -> None:
+        """
+        Initialize a profiler with no recorded calls.
+        """
+        self.histograms: dict[str, List[int]] = {}  # phase name -> calls per bucket
+        self.totals: dict[str, float] = {}  # phase name -> total seconds
+        self._patched: List[tuple[object, str, object]] = []
+
+    def phases(self) -> List[tuple[object, str]]:
+        """
+        Get the functions that are timed.
+
+        Returns:
+            list of (class or module, function name)
+        """
+        module = sys.modules[__name__]
+        return [(Board, 'simulate_lasers'), (Board, 'is_solved'), (Board, '_trace_segment'),
+                (ReflectBlock, 'interact'), (OpaqueBlock, 'interact'), (RefractBlock, 'interact'),
+                (CompactBoard, 'simulate_partial_lasers'), (CompactBoard, 'is_solved'),
+                (CompactBoard, '_trace_segment'), (module, 'search_placements')]
+
+    def enable(self) -> None:
+        """
+        Install the timing hooks.
+        """
+        for owner, name in self.phases():
+            function = owner.__dict__[name]
+            self._patched.append((owner, name, function))
+            phase = f"{owner.__name__}.{name}" if isinstance(owner, type) else name
+            setattr(owner, name, self._timed(phase, function))
+
+    def disable(self) -> None:
+        """
+        Remove the timing hooks.
+        """
+        while self._patched:
+            owner, name, function = self._patched.pop()
+            setattr(owner, name, function)
+
+    def _timed(self, phase: str, function: Callable) -> Callable:
+        """
+        Wrap a function so its calls are timed.
+
+        Arguments:
+            phase: name of the phase
+            function: function to wrap
+
+        Returns:
+            wrapped function
+        """
+        histogram = self.histograms.setdefault(phase, [0] * (len(HISTOGRAM_BOUNDS) + 1))
+        self.totals.setdefault(phase, 0.0)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                self.totals[phase] += elapsed
+                histogram[bisect.bisect_left(HISTOGRAM_BOUNDS, elapsed)] += 1
+        return timed
+
+    def report(self) -> str:
+        """
+        Format the recorded calls as a table.
+
+        Returns:
+            one line per phase with its calls, total time, mean time and
+            number of calls in each histogram bucket
+        """
+        labels = ['<1us', '<10us', '<100us', '<1ms', '<10ms', '<100ms', '<1s', '>=1s']
+        lines = [f"{'Phase':<40}{'calls':>10}{'total s':>10}{'mean us':>10}"
+                 + ''.join(f"{label:>9}" for label in labels)]
+        for phase, histogram in self.histograms.items():
+            calls = sum(histogram)
+            if calls == 0:
+                continue
+            mean = self.totals[phase] / calls * 1e6
+            lines.append(f"{phase:<40}{calls:>10}{self.totals[phase]:>10.4f}{mean:>10.2f}"
+                         + ''.join(f"{count:>9}" for count in histogram))
+        return '\n'.join(lines) + '\n'
+
+
+@contextlib.contextmanager
+def profiling(mode: Optional[str], output_base: str) -> Iterator[None]:
+    """
+    Profile the code run inside the with block, if profiling is on.
+
+    Arguments:
+        mode: 'histogram' for PhaseProfiler, writing {output_base}_profile.txt,
+            'cprofile' for cProfile, writing {output_base}.prof (read it with
+            pstats), or None to run without profiling
+        output_base: path of the profile output, without its extension
+
+    Raises:
+        ValueError: raises error if the mode is unknown
+    """
+    if not mode:
+        yield
+    elif mode == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(output_base + '.prof')
+    elif mode == 'histogram':
+        profiler = PhaseProfiler()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with open(output_base + '_profile.txt', 'w') as f:
+                f.write(profiler.report())
+    else:
+        raise ValueError(f"Unknown profile mode {mode!r}, use one of {PROFILE_MODES}")
+
+
+def find_bff_files(paths: List[str]) -> List[str]:
+    """
+    Expand the paths given on the command line into .bff files.
+
+    Arguments:
+        paths: .bff files, directories (all .bff files in them) or glob patterns
+
+    Returns:
+        sorted list of .bff files, without duplicates
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(glob.glob(os.path.join(path, '*.bff')))
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            files.update(glob.glob(path))
+    return sorted(files)
+
+
+def solve_file(input_file: str, strategy: str = 'forward',
+               cache_file: Optional[str] = None) -> tuple[str, str, float]:
+    """
+    Parse and solve one .bff file, and save its solution next to it as
+    {original}_solution.txt. The solve is profiled when the LAZOR_PROFILE
+    environment variable is set (see profiling), and then the cache is not
+    used, so that the profile shows the board actually being solved.
+
+    Arguments:
+        input_file: path to the .bff file
+        strategy: solver strategy, see solver
+        cache_file: SQLite file of the SolutionCache to use, if any
+
+    Returns:
+        input file, result message, and seconds taken
+    """
+    output_base = os.path.splitext(input_file)[0]
+    output_file = output_base + '_solution.txt'
+    time_start = time.time()  # Start timer
+
+    profile = os.environ.get(PROFILE_VARIABLE)
+    try:
+        with profiling(profile, output_base):
+            grid, board = parse_bff(input_file)
+            cache = open_solution_cache(cache_file) if cache_file and not profile else None
+            solution = solver(board, strategy=strategy, cache=cache)
+    except (OSError, ValueError, sqlite3.Error) as error:
+        return input_file, f"error: {error}", time.time() - time_start
+
+    time_taken = time.time() - time_start
+
+    if solution is None:
+        return input_file, "no solution", time_taken
+    save_solution(board, grid, output_file)
+    return input_file, f"saved to {output_file}", time_taken
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Command line entry point: solve many .bff files at once across a pool
+    of worker processes and print a timing table.
+
+    Arguments:
+        argv: command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description="Solve Lazor boards from .bff files.")
+    parser.add_argument('paths', nargs='*', default=['.'],
+                        help=".bff files, directories or glob patterns (default: current directory)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=os.environ.get(PROFILE_VARIABLE),
+                        help="profile each board and write {name}_profile.txt (histogram) or "
+                             f"{{name}}.prof (cprofile) next to it, solving without the cache "
+                             f"(default: ${PROFILE_VARIABLE})")
+    parser.add_argument('--cache', default=SOLUTION_CACHE_FILE,
+                        help=f"SQLite file of solved boards to reuse (default: {SOLUTION_CACHE_FILE})")
+    parser.add_argument('--no-cache', dest='cache', action='store_const', const=None,
+                        help="solve every board, without reading or writing the cache")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="log a summary of each parsed board")
+    parser.add_argument('-s', '--strategy', choices=list(STRATEGIES), default='forward',
+                        help="solver strategy (default: forward, sat needs python-sat and batch needs NumPy)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(levelname)s: %(message)s')
+    if args.strategy == 'sat' and SatSolver is None:
+        parser.error("the sat strategy needs python-sat: pip install python-sat")
+    if args.strategy == 'batch' and np is None:
+        parser.error("the batch strategy needs NumPy: pip install numpy")
+    if args.workers is not None and args.workers < 1:
+        parser.error("-j/--workers must be at least 1")
+
+    # Worker processes read the profile mode from the environment
+    if args.profile:
+        os.environ[PROFILE_VARIABLE] = args.profile
+
+    input_files = find_bff_files(args.paths)
+    if not input_files:
+        parser.error("no .bff files found")
+
+    # Create the cache once, before the workers open it all at once
+    if args.cache:
+        try:
+            SolutionCache(args.cache).close()
+        except sqlite3.Error as error:
+            parser.error(f"cannot open the cache {args.cache}: {error}")
+
+    time_start = time.time()  # Start timer
+    solve = functools.partial(solve_file, strategy=args.strategy, cache_file=args.cache)
+    with multiprocessing.Pool(args.workers) as pool:
+        results = sorted(pool.imap_unordered(solve, input_files))
+    time_taken = time.time() - time_start
+
+    width = max(len(input_file) for input_file in input_files)
+    print(f"{'Board':<{width}}  {'Seconds':>9}  Result")
+    for input_file, message, seconds in results:
+        print(f"{input_file:<{width}}  {seconds:>9.3f}  {message}")
+    print(f"{len(results)} boards in {time_taken:.3f} seconds.")
+
+
+if __name__ == '__main__':
+    main()
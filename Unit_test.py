@@ -1,5 +1,45 @@
+import contextlib
+import gc
+import io
+import os
+import tempfile
 import unittest
-from Main_Code_Block import Point, Laser, ReflectBlock, OpaqueBlock, RefractBlock, Board
+from unittest.mock import patch
+from Main_Code_Block import Point, Laser, ReflectBlock, OpaqueBlock, RefractBlock, Board, CompactBoard, solver, parallel_solver
+from Main_Code_Block import search_placements, split_search, STRATEGIES
+from Main_Code_Block import parse_bff, parse_bff_stream, bff_cache_path, BFF_CACHE_HEADER, BOARD_HEADER, PuzzleArchive, write_puzzle_archive
+from Main_Code_Block import main, find_bff_files, SearchStats, PhaseProfiler, SatSolver, np, evaluate_batch
+from Main_Code_Block import SolutionCache, SOLUTION_CACHE_VERSION, _solution_caches, board_key, open_solution_cache
+from Main_Code_Block import BLOCK_CODES, DIRECTIONS, DIRECTION_CODES, TRANSITIONS
+
+def corridor_board(available_blocks, targets=((1, 0), (7, 0))):
+    """
+    Board of one laser shone left along a row of four positions, with a
+    fifth position below the row that the laser never reaches.
+    """
+    board = Board(8, 4)
+    board.empty_positions = [Point(0, 0), Point(2, 0), Point(4, 0), Point(6, 0), Point(2, 2)]
+    board.available_blocks = available_blocks
+    board.add_laser(7, 0, -1, 0)
+    for target in targets:
+        board.add_target(*target)
+    return board
+
+
+def crossing_board(targets):
+    """
+    3x3 board of two lasers crossing at the centre, with a reflect block
+    and two refract blocks to place.
+    """
+    board = Board(6, 6)
+    board.empty_positions = [Point(x, y) for y in (0, 2, 4) for x in (0, 2, 4)]
+    board.available_blocks = {'A': 1, 'B': 0, 'C': 2}
+    board.add_laser(5, 2, -1, 0)
+    board.add_laser(2, 5, 0, -1)
+    for target in targets:
+        board.add_target(*target)
+    return board
+
 
 class TestGame(unittest.TestCase):
     def point_test(self):
@@ -32,5 +72,542 @@ class TestGame(unittest.TestCase):
         self.assertIn(Laser(Point(3, 3), Point(-1, -1)), refracted_laser)
 
 
+    def test_solver_evaluates_each_board_once(self):
+        board = Board(8, 2)
+        board.empty_positions = [Point(0, 0), Point(2, 0), Point(4, 0), Point(6, 0)]
+        board.available_blocks = {'A': 0, 'B': 0, 'C': 2}
+        # Refract blocks let the laser through, so it reaches every position
+        board.add_laser(7, 0, -1, 0)
+        # Below the first position, which the laser never turns towards
+        board.add_target(0, 1)
+
+        evaluated = set()
+        def is_solved(compact):
+            layout = bytes(compact.cells)
+            self.assertNotIn(layout, evaluated)
+            evaluated.add(layout)
+            return False
+
+        with patch.object(CompactBoard, 'is_solved', is_solved):
+            self.assertIsNone(solver(board))
+        # 4 positions, choose 2 for the 'C' blocks
+        self.assertEqual(len(evaluated), 6)
+
+    def test_solver_never_repeats_a_state(self):
+        board = Board(6, 6)
+        board.empty_positions = [Point(x, y) for x in (0, 2, 4) for y in (0, 2, 4)]
+        board.available_blocks = {'A': 2, 'B': 1, 'C': 1}
+        board.add_laser(5, 2, -1, 0)
+        board.add_laser(2, 5, 0, -1)
+        # In line with positions no laser reaches, so it is never given up
+        board.add_target(1, 0)
+
+        states = []
+        simulate_partial_lasers = CompactBoard.simulate_partial_lasers
+        def record_state(compact, undecided, *args):
+            states.append((bytes(compact.cells), frozenset(undecided)))
+            return simulate_partial_lasers(compact, undecided, *args)
+
+        with patch.object(CompactBoard, 'simulate_partial_lasers', record_state):
+            self.assertIsNone(solver(board))
+        self.assertGreater(len(states), 10)
+        self.assertEqual(len(states), len(set(states)))
+
+    def test_solver_stats_and_progress(self):
+        board = Board(8, 2)
+        board.empty_positions = [Point(0, 0), Point(2, 0), Point(4, 0), Point(6, 0)]
+        board.available_blocks = {'A': 0, 'B': 0, 'C': 2}
+        board.add_laser(7, 0, -1, 0)
+        board.add_target(1, 1)
+
+        stats = SearchStats()
+        remaining = []
+        self.assertIsNone(solver(board, stats, lambda _, left: remaining.append(left), progress_every=1))
+
+        # No position is in line with the target, so the search gives up
+        # before placing anything
+        self.assertEqual(stats.leaves, 0)
+        self.assertEqual(stats.prunes, 1)
+        self.assertEqual(len(remaining), stats.nodes)
+        self.assertEqual(remaining, sorted(remaining, reverse=True))
+        self.assertGreater(stats.steps_traced, 0)
+
+        # The other strategies cannot estimate what is left to search
+        for strategy in ('backward', 'sat', 'batch'):
+            with self.assertRaises(ValueError):
+                solver(board, progress=lambda _, left: None, strategy=strategy)
+
+    def test_solver_places_spare_blocks(self):
+        board = corridor_board({'A': 2, 'B': 0, 'C': 0})
+
+        # The laser has to be reflected back at (0, 0), the other block is
+        # spare and goes where no laser reaches it
+        solution = solver(board)
+        self.assertEqual({block.pos for block in solution}, {Point(0, 0), Point(2, 2)})
+        self.assertTrue(board.is_solved())
+
+
+    def test_backward_solver(self):
+        board = corridor_board({'A': 2, 'B': 0, 'C': 0})
+
+        solution = solver(board, strategy='backward')
+        self.assertEqual({block.pos for block in solution}, {Point(0, 0), Point(2, 2)})
+        self.assertTrue(board.is_solved())
+
+        board.add_target(1, 1)  # on no laser line
+        for pos in (Point(0, 0), Point(2, 2)):
+            board.remove_block(pos)
+        self.assertIsNone(solver(board, strategy='backward'))
+        with self.assertRaises(ValueError):
+            solver(board, strategy='sideways')
+
+    @unittest.skipIf(SatSolver is None, "python-sat is not installed")
+    def test_sat_solver(self):
+        board = corridor_board({'A': 2, 'B': 0, 'C': 0})
+
+        solution = solver(board, strategy='sat')
+        self.assertEqual(len(solution), 2)
+        self.assertIn(Point(0, 0), {block.pos for block in solution})
+        self.assertTrue(board.is_solved())
+
+        board.add_target(1, 1)  # on no laser line
+        for block in solution:
+            board.remove_block(block.pos)
+        self.assertIsNone(solver(board, strategy='sat'))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_evaluation(self):
+        board = corridor_board({'A': 1, 'B': 1, 'C': 0})
+        compact = CompactBoard.from_board(board)
+
+        candidates = np.zeros((3, 8 * 4), dtype=int)
+        candidates[0, compact.index(Point(0, 0))] = BLOCK_CODES['A']
+        candidates[1, compact.index(Point(2, 0))] = BLOCK_CODES['A']
+        candidates[2, compact.index(Point(0, 0))] = BLOCK_CODES['C']
+        self.assertEqual(list(evaluate_batch(compact, candidates)), [True, False, True])
+
+        solution = solver(board, strategy='batch')
+        self.assertEqual(len(solution), 2)
+        self.assertTrue(board.is_solved())
+
+    def test_solution_cache(self):
+        def make_board(target):
+            return corridor_board({'A': 2, 'B': 0, 'C': 0}, targets=((7, 0), target))
+
+        with tempfile.TemporaryDirectory() as folder, SolutionCache(os.path.join(folder, 'cache.sqlite')) as cache:
+            solution = solver(make_board((1, 0)), cache=cache)
+            unsolvable = make_board((1, 1))
+            self.assertIsNone(solver(unsolvable, cache=cache))
+
+            # Solved again from the cache, without searching
+            board = make_board((1, 0))
+            with patch('Main_Code_Block.search_placements', side_effect=AssertionError("board searched again")):
+                cached_solution = solver(board, cache=cache)
+                self.assertIsNone(solver(make_board((1, 1)), cache=cache))
+            self.assertEqual({block.pos for block in cached_solution}, {block.pos for block in solution})
+            self.assertTrue(board.is_solved())
+
+            # A cached solution that does not solve the board is searched again
+            cache.put(board_key(unsolvable), [(0, 0, 'B'), (2, 2, 'B')])
+            self.assertIsNone(solver(unsolvable, cache=cache))
+            self.assertEqual(unsolvable.grid, {})
+
+            # So are cached blocks that are not a solution of the board at all
+            for blocks in ([(0, 0, 'A')], [(0, 0, 'A'), (0, 0, 'A')], [(0, 0, 'A'), (8, 0, 'A')],
+                           [(0, 0, 'A'), (2, 0, 'B')]):
+                with self.subTest(blocks=blocks):
+                    cache.put(board_key(board), blocks)
+                    board = make_board((1, 0))
+                    self.assertEqual(len(solver(board, cache=cache)), 2)
+                    self.assertEqual(len(board.grid), 2)
+                    self.assertTrue(board.is_solved())
+
+            # Worker processes share the file and keep it open
+            self.assertEqual(cache.connection.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            shared = open_solution_cache(cache.filename)
+            self.assertIs(open_solution_cache(cache.filename), shared)
+            self.assertEqual(shared.get(board_key(board)), cache.get(board_key(board)))
+            shared.close()
+            del _solution_caches[cache.filename]
+
+        # Results of an older solver version are dropped
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'cache.sqlite')
+            with SolutionCache(filename) as cache:
+                cache.put(board_key(unsolvable), None)
+                with cache.connection:
+                    cache.connection.execute(f"PRAGMA user_version = {SOLUTION_CACHE_VERSION - 1}")
+            with SolutionCache(filename) as cache:
+                self.assertEqual(cache.get(board_key(unsolvable)), (False, None))
+
+        self.assertNotEqual(board_key(make_board((1, 0))), board_key(make_board((1, 1))))
+        other = Board(8, 4)
+        other.empty_positions = [Point(2, 2), Point(6, 0), Point(4, 0), Point(2, 0), Point(0, 0)]
+        other.available_blocks = {'A': 2, 'B': 0, 'C': 0}
+        other.add_target(1, 0)
+        other.add_target(7, 0)
+        other.add_laser(7, 0, -1, 0)
+        self.assertEqual(board_key(other), board_key(make_board((1, 0))))
+
+    def test_parallel_solver(self):
+        board = corridor_board({'A': 1, 'B': 1, 'C': 0})
+
+        solution = parallel_solver(board, workers=2)
+        self.assertEqual(len(solution), 2)
+        self.assertTrue(board.is_solved())
+
+    def test_strategies_add_to_stats(self):
+        strategies = ['forward', 'backward']
+        if SatSolver is not None:
+            strategies.append('sat')
+
+        for strategy in strategies:
+            with self.subTest(strategy=strategy):
+                compact = CompactBoard.from_board(crossing_board(((1, 2), (2, 5))))
+                cells = bytes(compact.cells)
+                stats = SearchStats()
+                STRATEGIES[strategy](compact, stats=stats)
+                once = stats.simulations
+                self.assertGreater(once, 0)
+                STRATEGIES[strategy](compact, stats=stats)
+                self.assertEqual(stats.simulations, 2 * once)
+                self.assertEqual(compact.cells, cells)
+
+    def test_split_search(self):
+        for targets in (((1, 2), (2, 5)), ((1, 2), (2, 5), (0, 1))):
+            with self.subTest(targets=targets):
+                compact = CompactBoard.from_board(crossing_board(targets))
+                cells = bytes(compact.cells)
+                subtrees = split_search(compact, 6)
+                self.assertGreaterEqual(len(subtrees), 6)
+                solutions = [search_placements(compact, *subtree) for subtree in subtrees]
+                self.assertEqual(any(solutions), len(targets) == 2)
+                self.assertEqual(compact.cells, cells)
+
+    def test_strategies_agree(self):
+        strategies = ['backward']
+        if SatSolver is not None:
+            strategies.append('sat')
+        if np is not None:
+            strategies.append('batch')
+
+        for targets in (((1, 2), (2, 5)), ((1, 2), (2, 5), (0, 1))):
+            with self.subTest(targets=targets):
+                solvable = solver(crossing_board(targets)) is not None
+                self.assertEqual(solvable, len(targets) == 2)
+                for strategy in strategies:
+                    board = crossing_board(targets)
+                    solution = solver(board, strategy=strategy)
+                    self.assertEqual(solution is not None, solvable, strategy)
+                    self.assertEqual(board.is_solved(), solvable, strategy)
+                board = crossing_board(targets)
+                self.assertEqual(parallel_solver(board, workers=2) is not None, solvable)
+                self.assertEqual(board.is_solved(), solvable)
+
+    def test_simulation_follows_block_changes(self):
+        board = Board(6, 4)
+        board.add_laser(0, 2, 1, 0)
+        self.assertEqual(board.simulate_lasers(), {Point(x, 2) for x in range(1, 6)})
+
+        # Laser is reflected back by a block at (2, 2)
+        board.add_block(ReflectBlock(Point(2, 2)))
+        self.assertEqual(board.simulate_lasers(), {Point(0, 2), Point(1, 2), Point(2, 2)})
+
+        board.remove_block(Point(2, 2))
+        self.assertEqual(board.simulate_lasers(), {Point(x, 2) for x in range(1, 6)})
+
+        # The grid can only be changed through add_block and remove_block
+        with self.assertRaises(TypeError):
+            board.grid[Point(2, 2)] = ReflectBlock(Point(2, 2))
+        self.assertEqual(board.grid, {})
+
+
+    def test_solver_prunes_unreachable_targets(self):
+        board = Board(4, 4)
+        board.empty_positions = [Point(0, 0), Point(2, 0), Point(0, 2), Point(2, 2)]
+        board.available_blocks = {'A': 2, 'B': 0, 'C': 0}
+        board.add_laser(0, 1, 1, 0)  # never crosses an empty position
+        board.add_target(3, 3)
+
+        with patch.object(CompactBoard, 'is_solved', lambda compact: self.fail("search should have been pruned")):
+            self.assertIsNone(solver(board))
+
+
+    def test_source_paths_follow_block_changes(self):
+        board = Board(6, 6)
+        board.add_laser(0, 2, 1, 0)
+        board.add_laser(0, 4, 1, 0)
+        compact = CompactBoard.from_board(board)
+        compact.simulate_lasers()
+
+        # Only the path of the laser crossing the new block is traced again
+        compact.add_block(compact.index(Point(4, 4)), BLOCK_CODES['B'])
+        self.assertEqual(list(compact._source_paths), [(0, 2, DIRECTION_CODES[(1, 0)])])
+        steps_traced = compact.steps_traced
+        self.assertEqual({compact.point(index) for index in compact.simulate_lasers()},
+                         {Point(x, 2) for x in range(1, 6)} | {Point(1, 4), Point(2, 4), Point(3, 4), Point(4, 4)})
+        self.assertEqual(compact.steps_traced - steps_traced, 4)
+
+        compact.remove_block(compact.index(Point(4, 4)))
+        self.assertEqual({compact.point(index) for index in compact.simulate_lasers()},
+                         {Point(x, y) for x in range(1, 6) for y in (2, 4)})
+
+    def test_compact_is_solved_stops_early(self):
+        board = Board(6, 4)
+        board.add_laser(0, 2, 1, 0)
+        board.add_laser(0, 1, 1, 0)
+        board.add_target(3, 2)
+        compact = CompactBoard.from_board(board)
+        self.assertEqual(compact.target_mask, 1 << compact.index(Point(3, 2)))
+
+        # Every target is hit by the first laser, the second is never traced
+        self.assertTrue(compact.is_solved())
+        self.assertEqual(compact.steps_traced, 5)
+
+        compact.targets = compact.targets | {-1}  # off the board
+        self.assertFalse(compact.is_solved())
+
+    def test_is_solved_stops_early(self):
+        board = Board(6, 4)
+        board.add_laser(0, 2, 1, 0)
+        board.add_laser(0, 1, 1, 0)
+        board.add_block(RefractBlock(Point(2, 2)))
+        board.add_target(1, 1)
+
+        traced = []
+        trace_segment = Board._trace_segment
+        def record_segment(board, *laser_id):
+            traced.append(laser_id)
+            return trace_segment(board, *laser_id)
+
+        # The laser at y = 1 is followed first and hits the only target
+        with patch.object(Board, '_trace_segment', record_segment):
+            self.assertTrue(board.is_solved())
+        self.assertEqual(traced, [(0, 1, 1, 0)])
+
+        board.add_target(5, 3)  # on no laser line
+        self.assertFalse(board.is_solved())
+        self.assertEqual(board.is_solved(), board.targets.issubset(board.simulate_lasers()))
+
+    def test_simulation_uses_current_lasers(self):
+        board = Board(6, 4)
+        board.add_laser(0, 2, 1, 0)
+        board.add_block(RefractBlock(Point(2, 2)))
+        board.simulate_lasers()
+        self.assertEqual(board.lasers, [Laser(Point(0, 2), Point(1, 0))])
+
+        # Lasers are read again on every call, not copied once
+        board.lasers[0] = Laser(Point(0, 1), Point(1, 0))
+        self.assertEqual(board.simulate_lasers(), {Point(x, 1) for x in range(1, 6)})
+
+    def test_grid_hash(self):
+        board = Board(8, 8)
+        self.assertEqual(board.grid_hash, 0)
+        board.add_block(ReflectBlock(Point(0, 0)))
+        board.add_block(OpaqueBlock(Point(2, 4)))
+        board.add_block(RefractBlock(Point(6, 6)))
+        board.remove_block(Point(2, 4))
+
+        other = Board(8, 8)
+        other.add_block(RefractBlock(Point(6, 6)))
+        other.add_block(ReflectBlock(Point(0, 0)))
+        self.assertEqual(board.grid_hash, other.grid_hash)
+        self.assertEqual(CompactBoard.from_board(board).grid_hash, board.grid_hash)
+
+        other.remove_block(Point(0, 0))
+        other.add_block(OpaqueBlock(Point(0, 0)))
+        self.assertNotEqual(board.grid_hash, other.grid_hash)
+
+    def test_compact_board_matches_board(self):
+        board = Board(8, 4)
+        board.add_laser(7, 2, -1, 0)
+        board.add_laser(4, 3, 0, -1)
+        board.add_block(RefractBlock(Point(2, 2)))
+        board.add_block(ReflectBlock(Point(4, 0)))
+        compact = CompactBoard.from_board(board)
+
+        self.assertEqual({compact.point(index) for index in compact.simulate_lasers()},
+                         board.simulate_lasers())
+        self.assertEqual(compact.block_letter(Point(2, 2)), 'C')
+        self.assertIsNone(compact.block_letter(Point(0, 0)))
+
+
+    def test_transition_table(self):
+        def transition(letter, direction):
+            outgoing = TRANSITIONS[BLOCK_CODES[letter] * len(DIRECTIONS) + DIRECTION_CODES[direction]]
+            return outgoing if outgoing is None else [DIRECTIONS[code] for code in outgoing]
+
+        self.assertEqual(transition('A', (1, 0)), [(-1, 0)])
+        self.assertEqual(transition('B', (0, 1)), [])
+        self.assertEqual(transition('C', (0, -1)), [(0, -1), (0, 1)])
+        self.assertIsNone(transition('A', (1, 1)))  # diagonal lasers cannot enter a block
+
+
+    def test_parse_bff_stream(self):
+        text = "# comment\nGRID START\no B\nx o\nGRID STOP\nA 1\nL 0 1 1 0\nP 3 1\n"
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            grid, board = parse_bff_stream(io.StringIO(text))
+            same_grid, same_board = parse_bff_stream(text.encode())
+        self.assertEqual(output.getvalue(), "")
+
+        self.assertEqual(grid, [['o', 'B'], ['x', 'o']])
+        self.assertEqual((board.width, board.height), (4, 4))
+        self.assertEqual(board.empty_positions, [Point(0, 0), Point(2, 2)])
+        self.assertEqual(board.block_letter(Point(2, 0)), 'B')
+        self.assertEqual(board.available_blocks, {'A': 1, 'B': 0, 'C': 0})
+        self.assertEqual(board.lasers, [Laser(Point(0, 1), Point(1, 0))])
+        self.assertEqual(board.targets, {Point(3, 1)})
+        self.assertEqual((same_grid, same_board.grid_hash), (grid, board.grid_hash))
+
+        # Binary streams are left open for the caller
+        stream = io.BytesIO(text.encode())
+        parse_bff_stream(stream)
+        self.assertFalse(stream.closed)
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'board.bff')
+            with open(filename, 'w') as bff_file:
+                bff_file.write(text)
+            with open(filename, 'rb') as bff_file:
+                parse_bff_stream(bff_file)
+                gc.collect()
+                self.assertFalse(bff_file.closed)
+                self.assertEqual(bff_file.read(), b"")
+
+        for bad in ("GRID START\no z\nGRID STOP\n", "GRID START\no o\no\nGRID STOP\n",
+                    "GRID START\no\nGRID STOP\nL 0 1 1\n", "GRID START\no\n"):
+            with self.assertRaises(ValueError):
+                parse_bff_stream(io.StringIO(bad))
+
+    def test_board_bytes(self):
+        _, board = parse_bff_stream(b"GRID START\no B\nx o\nGRID STOP\nA 1\nL 0 1 1 0\nP 3 1\nP 1 2\n")
+        board.add_block(ReflectBlock(Point(2, 2)))
+        copy = Board.from_bytes(board.to_bytes())
+
+        self.assertEqual((copy.width, copy.height), (board.width, board.height))
+        self.assertEqual(copy.grid_hash, board.grid_hash)
+        self.assertEqual({pos: block.fixed for pos, block in copy.grid.items()},
+                         {Point(2, 0): True, Point(2, 2): False})
+        self.assertEqual(copy.lasers, board.lasers)
+        self.assertEqual(copy.targets, board.targets)
+        self.assertEqual(copy.empty_positions, board.empty_positions)
+        self.assertEqual(copy.available_blocks, board.available_blocks)
+        self.assertEqual(copy.grid_letters(), [['o', 'B'], ['x', 'o']])
+
+        with self.assertRaises(ValueError):
+            Board.from_bytes(board.to_bytes()[:-1])
+
+    def test_parse_bff_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'board.bff')
+            with open(filename, 'w') as f:
+                f.write("GRID START\no B\nGRID STOP\nA 1\nP 1 1\n")
+            grid, board = parse_bff(filename)
+            self.assertTrue(os.path.exists(bff_cache_path(filename)))
+
+            # The second parse loads the cached board, and logs it the same way
+            with patch('Main_Code_Block.parse_bff_stream', side_effect=AssertionError("file parsed again")), \
+                    self.assertLogs('Main_Code_Block', 'DEBUG') as logs:
+                cached_grid, cached_board = parse_bff(filename)
+            self.assertIn("1x2 grid", logs.output[0])
+            self.assertEqual(cached_grid, grid)
+            self.assertEqual(cached_board.targets, board.targets)
+
+            # Changing the file makes the cache stale
+            with open(filename, 'w') as f:
+                f.write("GRID START\no B o\nGRID STOP\nA 1\nP 1 1\n")
+            self.assertEqual(parse_bff(filename)[0], [['o', 'B', 'o']])
+
+            # A cached board with an unknown block code is parsed again
+            cache_file = bff_cache_path(filename)
+            with open(cache_file, 'r+b') as f:
+                f.seek(BFF_CACHE_HEADER.size + BOARD_HEADER.size + 4)  # code of the 'B' block
+                f.write(bytes([7]))
+            self.assertEqual(parse_bff(filename)[1].block_letter(Point(2, 0)), 'B')
+
+            # A board that does not fit the binary format is not cached
+            with open(filename, 'w') as f:
+                f.write("GRID START\no\nGRID STOP\nL 40000 1 1 0\nP 1 1\n")
+            os.remove(cache_file)
+            self.assertEqual(parse_bff(filename)[1].lasers, [Laser(Point(40000, 1), Point(1, 0))])
+            self.assertEqual(os.listdir(os.path.dirname(cache_file)), [])
+
+    def test_puzzle_archive(self):
+        boards = [parse_bff_stream(f"GRID START\no o\nGRID STOP\nA 1\nL 4 {y} -1 0\nP 1 {y}\n".encode())
+                  for y in (0, 1, 2)]
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'boards.lzar')
+            self.assertEqual(write_puzzle_archive(filename, ((f"board_{y}", board) for y, (_, board) in enumerate(boards))), 3)
+
+            with PuzzleArchive(filename) as archive:
+                self.assertEqual(len(archive), 3)
+                self.assertEqual(archive.name(-1), 'board_2')
+                grid, board = archive[1]
+                self.assertEqual(grid, boards[1][0])
+                self.assertEqual(board.lasers, boards[1][1].lasers)
+                self.assertEqual([board.targets for _, board in archive], [board.targets for _, board in boards])
+                with self.assertRaises(IndexError):
+                    archive[3]
+
+            # Boards read from the archive work with the solver
+            solution = solver(board)
+            self.assertEqual({block.pos for block in solution}, {Point(0, 0)})
+
+            with open(filename, 'r+b') as f:
+                f.write(b'XXXX')
+            with self.assertRaises(ValueError):
+                PuzzleArchive(filename)
+
+            # An error while writing leaves no archive to open
+            def failing_boards():
+                yield "board_0", boards[0][1]
+                raise RuntimeError("generator failed")
+            broken = os.path.join(folder, 'broken.lzar')
+            with self.assertRaises(RuntimeError):
+                write_puzzle_archive(broken, failing_boards())
+            with self.assertRaises(FileNotFoundError):
+                PuzzleArchive(broken)
+            self.assertEqual(sorted(os.listdir(folder)), ['boards.lzar'])
+
+    def test_main_rejects_bad_worker_counts(self):
+        for workers in ('0', '-2'):
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()) as error:
+                main(['-j', workers, '--no-cache', 'tiny_5.bff'])
+            self.assertIn("-j/--workers must be at least 1", error.getvalue())
+
+    def test_find_bff_files(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ('a.bff', 'b.bff', 'a_solution.txt'):
+                open(os.path.join(folder, name), 'w').close()
+            a_file = os.path.join(folder, 'a.bff')
+            b_file = os.path.join(folder, 'b.bff')
+
+            self.assertEqual(find_bff_files([folder]), [a_file, b_file])
+            self.assertEqual(find_bff_files([os.path.join(folder, 'b*')]), [b_file])
+            self.assertEqual(find_bff_files([a_file, folder]), [a_file, b_file])
+
+
+    def test_phase_profiler(self):
+        board = Board(6, 4)
+        board.add_laser(0, 2, 1, 0)
+        board.add_block(ReflectBlock(Point(2, 2)))
+        simulate_lasers = Board.simulate_lasers
+
+        profiler = PhaseProfiler()
+        profiler.enable()
+        try:
+            board.simulate_lasers()
+            board.is_solved()
+        finally:
+            profiler.disable()
+
+        self.assertIs(Board.simulate_lasers, simulate_lasers)
+        self.assertEqual(sum(profiler.histograms['Board.simulate_lasers']), 1)
+        # The two segments traced by simulate_lasers are reused by is_solved
+        self.assertEqual(sum(profiler.histograms['Board._trace_segment']), 2)
+        self.assertEqual(sum(profiler.histograms['ReflectBlock.interact']), 1)
+        self.assertIn('Board.is_solved', profiler.report())
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Lazor benchmark suite
+
+Runs parse_bff, Board.simulate_lasers and solver over .bff boards (every
+.bff file next to this script by default) and records the wall time and
+the search counters of SearchStats (nodes explored, leaf evaluations,
+prunes, simulations and laser steps traced), so runs from different
+commits can be compared.
+
+Run with:
+    python benchmark.py [boards ...] [--strategy forward --strategy backward]
+                        [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+from Main_Code_Block import STRATEGIES, SearchStats, find_bff_files, parse_bff, solver
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    """
+    Run a function several times and keep the fastest wall time.
+
+    Arguments:
+        function: function to time
+        repeat: number of runs
+
+    Returns:
+        fastest time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - time_start)
+    return min(times)
+
+
+def benchmark_board(filename: str, repeat: int, strategy: str = 'forward') -> dict:
+    """
+    Benchmark one board. The text of the board is parsed every time, and
+    loading it from the parse cache of parse_bff is timed on a copy in a
+    temporary folder, so no cache is written next to the board.
+
+    Arguments:
+        filename: path to the .bff file
+        repeat: number of runs of each timed step
+        strategy: solver strategy to benchmark
+
+    Returns:
+        dictionary of results for the board
+    """
+    def simulate():
+        _, board = parse_bff(filename, use_cache=False)
+        time_start = time.perf_counter()
+        board.simulate_lasers()
+        return time.perf_counter() - time_start
+
+    def solve(stats=None):
+        _, board = parse_bff(filename, use_cache=False)
+        return solver(board, stats, strategy=strategy)
+
+    parse_seconds = best_time(lambda: parse_bff(filename, use_cache=False), repeat)
+    with tempfile.TemporaryDirectory() as folder:
+        cached_file = shutil.copy2(filename, folder)
+        parse_bff(cached_file)  # fill the cache
+        cached_load_seconds = best_time(lambda: parse_bff(cached_file), repeat)
+    simulate_seconds = min(simulate() for _ in range(repeat))
+    solve_seconds = best_time(solve, repeat)
+
+    # The search counters are the same for every run
+    stats = SearchStats()
+    solved = solve(stats) is not None
+
+    return {
+        'board': os.path.basename(filename),
+        'strategy': strategy,
+        'parse_seconds': parse_seconds,
+        'cached_load_seconds': cached_load_seconds,
+        'simulate_seconds': simulate_seconds,
+        'solve_seconds': solve_seconds,
+        'nodes_explored': stats.nodes,
+        'leaf_evaluations': stats.leaves,
+        'prunes': stats.prunes,
+        'simulations': stats.simulations,
+        'steps_traced': stats.steps_traced,
+        'solved': solved,
+    }
+
+
+def git_commit() -> Optional[str]:
+    """
+    Get the commit of the working tree, if it is a git checkout.
+
+    Returns:
+        commit hash, or None
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: List[dict], previous: Optional[List[dict]] = None) -> None:
+    """
+    Print the results as a table, with the speedup of the solve time
+    against previous results when given.
+
+    Arguments:
+        results: results of benchmark_board
+        previous: earlier results to compare against
+    """
+    def key(result):
+        return result['board'], result.get('strategy', 'forward')
+
+    previous_solve = {key(result): result['solve_seconds'] for result in previous or []}
+    print(f"{'Board':<20}{'strategy':<10}{'parse s':>10}{'cached s':>10}{'simulate s':>12}{'solve s':>10}{'nodes':>10}{'leaves':>10}  solved"
+          + ("  speedup" if previous else ""))
+    for result in results:
+        line = (f"{result['board']:<20}{result['strategy']:<10}{result['parse_seconds']:>10.5f}"
+                f"{result.get('cached_load_seconds', float('nan')):>10.5f}{result['simulate_seconds']:>12.6f}"
+                f"{result['solve_seconds']:>10.4f}{result['nodes_explored']:>10}{result['leaf_evaluations']:>10}"
+                f"  {str(result['solved']):<6}")
+        if key(result) in previous_solve:
+            line += f"  {previous_solve[key(result)] / max(result['solve_seconds'], 1e-9):.2f}x"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Command line entry point of the benchmark suite.
+
+    Arguments:
+        argv: command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the Lazor solver.")
+    parser.add_argument('paths', nargs='*', default=[os.path.dirname(os.path.abspath(__file__))],
+                        help=".bff files, directories or glob patterns (default: the bundled boards)")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="runs of each timed step (default: 3)")
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help="JSON file to write the results to (default: benchmark_results.json)")
+    parser.add_argument('-c', '--compare', help="JSON results of an earlier run to compare against")
+    parser.add_argument('-s', '--strategy', action='append', choices=list(STRATEGIES),
+                        help="solver strategy to benchmark, repeat to compare several (default: forward)")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("-r/--repeat must be at least 1")
+
+    results = [benchmark_board(filename, args.repeat, strategy)
+               for filename in find_bff_files(args.paths)
+               for strategy in args.strategy or ['forward']]
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+    print_results(results, previous)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': args.repeat,
+            'results': results,
+        }, f, indent=2)
+    print(f"Results are saved to {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
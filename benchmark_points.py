@@ -0,0 +1,111 @@
+"""
+Point micro-benchmark
+
+Compares the allocation and hashing cost of the named tuple Point used by
+Main_Code_Block against the dataclass Point it replaced.
+
+Run with:
+    python benchmark_points.py
+"""
+
+import sys
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+
+from Main_Code_Block import Point
+
+
+@dataclass
+class LegacyPoint:
+    '''
+    The previous dataclass Point, kept here as the "before" measurement.
+    '''
+    x: int
+    y: int
+
+    def __add__(self, other: 'LegacyPoint') -> 'LegacyPoint':
+        """ Add two points component-wise."""
+        return LegacyPoint(self.x + other.x, self.y + other.y)
+
+    def __eq__(self, other: object) -> bool:
+        """Checks to see if the two points have the same coordinates."""
+        if not isinstance(other, LegacyPoint):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+
+    def __hash__(self) -> int:
+        """ Make Point hashable for use in sets/dictionaries."""
+        return hash((self.x, self.y))
+
+
+def instance_size(point: object) -> int:
+    """
+    Get the memory used by one point, including its __dict__ if it has one.
+
+    Arguments:
+        point: point to measure
+
+    Returns:
+        size in bytes
+    """
+    size = sys.getsizeof(point)
+    if hasattr(point, '__dict__'):
+        size += sys.getsizeof(point.__dict__)
+    return size
+
+
+def set_memory(point_class: type, count: int) -> float:
+    """
+    Measure the memory per entry of a set of distinct points.
+
+    Arguments:
+        point_class: Point or LegacyPoint
+        count: number of points in the set
+
+    Returns:
+        bytes allocated per entry
+    """
+    tracemalloc.start()
+    points = {point_class(i, -i) for i in range(count)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del points
+    return size / count
+
+
+def benchmark(point_class: type, number: int = 200000) -> dict:
+    """
+    Time the hot point operations of the laser simulation.
+
+    Arguments:
+        point_class: Point or LegacyPoint
+        number: number of operations per measurement
+
+    Returns:
+        dictionary of nanoseconds per operation and bytes per point
+    """
+    start = point_class(3, 4)
+    step = point_class(1, -1)
+    grid = {point_class(x, y): None for x in range(20) for y in range(20)}
+
+    def per_op(statement):
+        return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e9
+
+    return {
+        'construct (ns)': per_op(lambda: point_class(3, 4)),
+        'add (ns)': per_op(lambda: start + step),
+        'hash (ns)': per_op(lambda: hash(start)),
+        'dict lookup (ns)': per_op(lambda: start in grid),
+        'instance (bytes)': instance_size(start),
+        'set entry (bytes)': set_memory(point_class, 100000),
+    }
+
+
+if __name__ == '__main__':
+    before = benchmark(LegacyPoint)
+    after = benchmark(Point)
+
+    print(f"{'':20}{'before':>10}{'after':>10}{'ratio':>8}")
+    for name in before:
+        print(f"{name:20}{before[name]:>10.1f}{after[name]:>10.1f}{before[name] / after[name]:>7.2f}x")